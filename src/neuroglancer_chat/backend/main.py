@@ -6,8 +6,12 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), '.env'))
 
-from fastapi import FastAPI, UploadFile, Body, Query, File
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, Body, Query, File, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+import orjson
 from .models import (
     ChatRequest, SetView, SetLUT, AddAnnotations, HistogramReq, IngestCSV, SaveState,
     AddLayer, SetLayerVisibility, NgSetViewerSettings, StateLoad, StateSummary,
@@ -60,8 +64,25 @@ def _dbg(msg: str):  # lightweight wrapper to centralize debug guard
     """Debug logging wrapper - now uses proper logger.debug()"""
     logger.debug(msg)
 
-# Configure FastAPI with increased file upload limit (500MB)
-app = FastAPI()
+class _ORJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson (numpy scalars and non-str keys allowed).
+
+    Decodes to the same JSON as Starlette's JSONResponse, except that NaN and
+    Infinity become ``null`` where the stdlib encoder refuses them.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _json_response(payload: dict) -> JSONResponse:
+    """Return a JSON-native payload as a Response so FastAPI skips jsonable_encoder."""
+    return _ORJSONResponse(payload)
+
+
+# Configure FastAPI with increased file upload limit (500MB). Responses are
+# encoded with orjson (large query_data payloads).
+app = FastAPI(default_response_class=_ORJSONResponse)
 
 # Configure request body size limit (500MB for CSV uploads)
 # This needs to be set at the ASGI server level (uvicorn) as well
@@ -86,6 +107,15 @@ _TRACE_HISTORY: list[dict] = []  # store recent full traces (in-memory, capped)
 _TRACE_HISTORY_MAX = 50
 LAST_QUERY_SUMMARY_ID = None  # Track most recent query result for easy reference
 
+def _eval_namespace(df) -> dict:
+    """Return a fresh restricted eval namespace binding `df`.
+
+    Only `pl` is exposed and builtins are empty (blocks import, open, eval,
+    exec, etc.). Built per call, including the builtins dict, so nothing an
+    expression does to its namespace carries over into later evals.
+    """
+    return {'pl': pl, 'df': df, '__builtins__': {}}
+
 
 def _translate_pandas_to_polars(expression: str) -> str:
     """Auto-translate common pandas syntax to Polars.
@@ -142,6 +172,20 @@ def _translate_pandas_to_polars(expression: str) -> str:
     return expression
 
 
+# Spatial coordinate column patterns in order of preference:
+# (required column set, ordered [x, y, z] names, pattern name)
+_SPATIAL_PATTERNS = [
+    (frozenset(cols), cols, name)
+    for cols, name in (
+        (('x', 'y', 'z'), 'xyz'),
+        (('centroid_x', 'centroid_y', 'centroid_z'), 'centroid_xyz'),
+        (('center_x', 'center_y', 'center_z'), 'center_xyz'),
+        (('pos_x', 'pos_y', 'pos_z'), 'pos_xyz'),
+        (('X', 'Y', 'Z'), 'XYZ'),
+    )
+]
+
+
 def _detect_spatial_columns(df) -> tuple[list[str], str] | None:
     """Detect spatial coordinate columns in a dataframe.
     
@@ -149,21 +193,10 @@ def _detect_spatial_columns(df) -> tuple[list[str], str] | None:
         Tuple of (column_names, pattern) or None if not found.
         Patterns: 'xyz', 'centroid_xyz', etc.
     """
-    import polars as pl
-    cols = df.columns
-    
-    # Try common patterns in order of preference
-    patterns = [
-        (['x', 'y', 'z'], 'xyz'),
-        (['centroid_x', 'centroid_y', 'centroid_z'], 'centroid_xyz'),
-        (['center_x', 'center_y', 'center_z'], 'center_xyz'),
-        (['pos_x', 'pos_y', 'pos_z'], 'pos_xyz'),
-        (['X', 'Y', 'Z'], 'XYZ'),
-    ]
-    
-    for col_names, pattern in patterns:
-        if all(c in cols for c in col_names):
-            return (col_names, pattern)
+    cols = set(df.columns)
+    for required, col_names, pattern in _SPATIAL_PATTERNS:
+        if required <= cols:
+            return (list(col_names), pattern)
     
     return None
 
@@ -172,6 +205,7 @@ def _generate_ng_links_for_rows(df, spatial_cols: list[str]) -> list[str]:
     """Generate Neuroglancer URLs for each row based on spatial coordinates.
     
     Hybrid approach: Returns raw URLs. Frontend will render them as clickable links.
+    Rows with a null coordinate get an empty string.
     
     Args:
         df: Polars DataFrame with spatial columns
@@ -180,29 +214,13 @@ def _generate_ng_links_for_rows(df, spatial_cols: list[str]) -> list[str]:
     Returns:
         List of raw NG URLs, one per row
     """
-    global CURRENT_STATE
-    
-    links = []
-    for row in df.to_dicts():
-        try:
-            cx, cy, cz = row[spatial_cols[0]], row[spatial_cols[1]], row[spatial_cols[2]]
-            # Skip rows with null coordinates
-            if cx is None or cy is None or cz is None:
-                links.append("")
-                continue
-                
-            # Clone current state and set view to this row's coordinates
-            state_copy = CURRENT_STATE.clone()
-            state_copy.set_view({"x": cx, "y": cy, "z": cz}, None, None)
-            link_url = state_copy.to_url()
-            
-            # Return raw URL (frontend will create markdown link)
-            links.append(link_url)
-        except Exception as e:
-            _dbg(f"Failed to generate link for row: {e}")
-            links.append("")
-    
-    return links
+    try:
+        centers = zip(*(df.get_column(c).to_list() for c in spatial_cols[:3]))
+        # Serializes CURRENT_STATE once; rows only encode their own position
+        return CURRENT_STATE.view_urls(centers)
+    except Exception as e:
+        _dbg(f"Failed to generate links for rows: {e}")
+        return [""] * df.height
 
 
 @app.post("/tools/ng_set_view")
@@ -261,6 +279,22 @@ def t_set_viewer_settings(args: NgSetViewerSettings):
     )
     return {"ok": True}
 
+def _to_ng_annotation(a, tail: list) -> dict:
+    """Neuroglancer annotation dict for an ``Annotation`` model.
+
+    Must include the 'type' field as per Neuroglancer schema; ``tail`` holds the
+    extra (time) coordinate when the state has a 't' dimension.
+    """
+    c = a.center
+    coords = [c.x, c.y, c.z, *tail]
+    if a.type == "point":
+        return {"point": coords, "type": "point", "id": a.id or None}
+    if a.type == "box":
+        return {"type": "box", "point": coords, "size": [a.size.x, a.size.y, a.size.z], "id": a.id or None}
+    # ellipsoid
+    return {"type": "ellipsoid", "center": coords, "radii": [a.size.x/2, a.size.y/2, a.size.z/2], "id": a.id or None}
+
+
 @app.post("/tools/ng_annotations_add")
 def t_add_annotations(args: AddAnnotations):
     """Add annotation(s) to a layer. Accepts either single annotation or items array."""
@@ -291,37 +325,10 @@ def t_add_annotations(args: AddAnnotations):
     if not annotations_list:
         return {"ok": False, "error": "Must provide either 'items' array or 'center' for single annotation"}
     
-    # Convert to Neuroglancer format
+    # Convert to Neuroglancer format in one pass.
     # Check if state has time dimension - if so, add 4th coordinate (default to 0)
-    has_time_dim = 't' in CURRENT_STATE.data.get('dimensions', {})
-    
-    items = []
-    for a in annotations_list:
-        if a.type == "point":
-            # Must include 'type' field as per Neuroglancer schema
-            # If state has time dimension, include 4th coordinate
-            point_coords = [a.center.x, a.center.y, a.center.z, 0] if has_time_dim else [a.center.x, a.center.y, a.center.z]
-            items.append({
-                "point": point_coords,
-                "type": "point",
-                "id": a.id or None
-            })
-        elif a.type == "box":
-            point_coords = [a.center.x, a.center.y, a.center.z, 0] if has_time_dim else [a.center.x, a.center.y, a.center.z]
-            items.append({
-                "type": "box",
-                "point": point_coords,
-                "size": [a.size.x, a.size.y, a.size.z],
-                "id": a.id or None
-            })
-        elif a.type == "ellipsoid":
-            center_coords = [a.center.x, a.center.y, a.center.z, 0] if has_time_dim else [a.center.x, a.center.y, a.center.z]
-            items.append({
-                "type": "ellipsoid",
-                "center": center_coords,
-                "radii": [a.size.x/2, a.size.y/2, a.size.z/2],
-                "id": a.id or None
-            })
+    tail = [0] if 't' in CURRENT_STATE.data.get('dimensions', {}) else []
+    items = [_to_ng_annotation(a, tail) for a in annotations_list]
     
     CURRENT_STATE.add_annotations(args.layer, items)
     return {"ok": True, "n_annotations": len(items)}
@@ -338,14 +345,8 @@ def t_csv(args: IngestCSV):
     rows = top_n_rois(df)
     return {"rows": rows}
 
-@app.post("/tools/state_save")
-def t_save_state(_: SaveState, mask: bool = Query(False, description="Return masked markdown link label instead of raw URL")):
-    """Persist current state and return its ID and URL.
-
-    If mask=true, also include 'masked_markdown' with a concise hyperlink label.
-    We do masking here (where state is definitively updated) instead of during
-    synthetic assistant message generation to avoid presenting stale links.
-    """
+def _save_state_payload(mask: bool = False) -> dict:
+    """Persist current state and return its ID and URL (plus masked link if requested)."""
     sid = save_state(CURRENT_STATE.as_dict())
     url = CURRENT_STATE.to_url()
     if mask:
@@ -357,8 +358,44 @@ def t_save_state(_: SaveState, mask: bool = Query(False, description="Return mas
     return {"sid": sid, "url": url}
 
 
-@app.post("/tools/state_load")
-def t_state_load(args: StateLoad):
+@app.post("/tools/state_save")
+def t_save_state(_: SaveState, mask: bool = Query(False, description="Return masked markdown link label instead of raw URL")):
+    """Persist current state and return its ID and URL.
+
+    If mask=true, also include 'masked_markdown' with a concise hyperlink label.
+    We do masking here (where state is definitively updated) instead of during
+    synthetic assistant message generation to avoid presenting stale links.
+    """
+    return _json_response(_save_state_payload(mask))
+
+
+async def _parse_json_body(request: Request, model: type[BaseModel]):
+    """Validate a JSON request body in one pass with Pydantic's JSON parser.
+
+    FastAPI would ``json.loads`` the body and then validate the resulting dict;
+    state_load bodies carry a whole percent-encoded state URL. Parsing runs in
+    the threadpool so large bodies don't block the event loop. Errors are raised
+    as FastAPI's usual 422 validation response.
+    """
+    body = await request.body()
+    try:
+        return await run_in_threadpool(model.model_validate_json, body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+
+# Documents the body that _parse_json_body reads for the state_load routes.
+_STATE_LOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": StateLoad.model_json_schema()}},
+    }
+}
+
+
+def _load_state(args: StateLoad) -> dict:
     """Load state from a Neuroglancer URL or fragment and set CURRENT_STATE."""
     global CURRENT_STATE
     try:
@@ -395,10 +432,17 @@ def t_state_load(args: StateLoad):
         return {"ok": False, "error": str(e)}
 
 
-@app.post("/tools/demo_load")
-def t_demo_load(args: StateLoad):
+@app.post("/tools/state_load", openapi_extra=_STATE_LOAD_OPENAPI)
+async def t_state_load(request: Request):
+    """Load state from a Neuroglancer URL or fragment and set CURRENT_STATE."""
+    # Decoding and installing the state is sync work; keep it off the loop too
+    return await run_in_threadpool(_load_state, await _parse_json_body(request, StateLoad))
+
+
+@app.post("/tools/demo_load", openapi_extra=_STATE_LOAD_OPENAPI)
+async def t_demo_load(request: Request):
     """Convenience: same as state_load, named for demos."""
-    return t_state_load(args)
+    return await run_in_threadpool(_load_state, await _parse_json_body(request, StateLoad))
 
 # TODO
 #Optional (alternative path): if you prefer “read-only” to still be tool-based, 
@@ -1140,14 +1184,13 @@ def _execute_tool_by_name(name: str, args: dict):
             from .models import IngestCSV
             return t_csv(IngestCSV(**args))
         if name == "state_save":
-            from .models import SaveState
-            return t_save_state(SaveState())
+            return _save_state_payload()
         if name == "state_load":
             from .models import StateLoad
-            return t_state_load(StateLoad(**args))
+            return _load_state(StateLoad(**args))
         if name == "ng_state_summary":
             from .models import StateSummary
-            return t_state_summary(StateSummary(**args))
+            return summarize_state_struct(CURRENT_STATE, detail=StateSummary(**args).detail)
         if name == "ng_state_link":
             return t_state_link()
         if name == "data_list_files":
@@ -1186,6 +1229,13 @@ def _execute_tool_by_name(name: str, args: dict):
     return {"error": f"Unknown tool {name}"}
 
 
+# Query-result tables already carry their own `| [view](https://...) |` links.
+_VIEW_TABLE_LINK_RE = re.compile(r'\|\s*\[view\]\(https?://[^\)]+\)\s*\|')
+_NG_URL_RE = re.compile(r"https?://[^\s)]*neuroglancer[^\s)]*")
+_TOKEN_RE = re.compile(r"\S+")
+_MASKED_LABEL_RE = re.compile(r"\[(Updated Neuroglancer view(?: \(\d+\))?)\]")
+
+
 def _mask_ng_urls(text: str) -> str:
     """Replace full Neuroglancer URLs with a concise markdown hyperlink.
 
@@ -1196,38 +1246,37 @@ def _mask_ng_urls(text: str) -> str:
     Skips masking if the text already contains markdown table with [view](...) links
     to avoid double-wrapping.
     """
-    import re
-    
     # Check if text contains markdown table with [view](...) links (from query results)
-    # Pattern: | ... | [view](https://...) |
-    if re.search(r'\|\s*\[view\]\(https?://[^\)]+\)\s*\|', text):
+    if _VIEW_TABLE_LINK_RE.search(text):
         _dbg("Skipping URL masking - text contains markdown table with [view] links")
         return text
     
-    url_pattern = re.compile(r"https?://[^\s)]+")
-    candidates = url_pattern.findall(text)
-    urls = [u for u in candidates if 'neuroglancer' in u]
+    spans = [m.span() for m in _NG_URL_RE.finditer(text)]
     # Also detect tokens missing scheme but containing neuroglancer + fragment (#!%7B)
     if 'neuroglancer' in text and '#!%7B' in text:
-        tokens = re.split(r"\s+", text)
-        for tok in tokens:
+        for m in _TOKEN_RE.finditer(text):
+            tok = m.group()
             if 'neuroglancer' in tok and '#!%7B' in tok and 'http' not in tok:
-                urls.append(tok)
-    if not urls:
+                spans.append(m.span())
+        spans.sort()
+    if not spans:
         return text
-    ordered = []
-    seen = set()
-    for u in urls:
-        if u not in seen:
-            ordered.append(u)
-            seen.add(u)
+    # Single left-to-right pass; labels are numbered by first appearance
     label_map = {}
-    for idx, u in enumerate(ordered):
-        base = "Updated Neuroglancer view" if idx == 0 else f"Updated Neuroglancer view ({idx+1})"
-        label_map[u] = f"[{base}]({u})"
-    for raw_url, repl in label_map.items():
-        text = text.replace(raw_url, repl)
-    return text
+    parts = []
+    pos = 0
+    for start, end in spans:
+        u = text[start:end]
+        repl = label_map.get(u)
+        if repl is None:
+            idx = len(label_map)
+            base = "Updated Neuroglancer view" if idx == 0 else f"Updated Neuroglancer view ({idx+1})"
+            repl = label_map[u] = f"[{base}]({u})"
+        parts.append(text[pos:start])
+        parts.append(repl)
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
 
 
 @app.post("/tools/ng_state_link")
@@ -1333,7 +1382,7 @@ def summarize_state_struct(state, detail: str = "standard") -> dict:
 
 @app.post("/tools/ng_state_summary")
 def t_state_summary(args: StateSummary):
-    return summarize_state_struct(CURRENT_STATE, detail=args.detail)
+    return _json_response(summarize_state_struct(CURRENT_STATE, detail=args.detail))
 
 # ------------------- Data tool endpoints -------------------
 
@@ -1483,15 +1532,9 @@ def execute_query_polars(
     if expression != original_expression:
         _dbg(f"Auto-translated: {original_expression[:80]} → {expression[:80]}")
     
-    # Execute in restricted namespace (only Polars, no builtins)
-    namespace = {
-        'pl': pl,
-        'df': df,
-        '__builtins__': {}  # Critical: blocks import, open, eval, exec, etc.
-    }
-    
     try:
-        result = eval(expression, namespace, {})
+        # Execute in restricted namespace (only Polars, no builtins)
+        result = eval(expression, _eval_namespace(df), {})
         
         # Handle different result types
         if isinstance(result, pl.DataFrame):
@@ -1627,7 +1670,6 @@ def t_data_ng_views_table(args: NgViewsTable):
     for user continuity. Returns table rows with raw + masked links and stores a
     summary table in DataMemory (kind='ng_views').
     """
-    from copy import deepcopy
     global CURRENT_STATE
     warnings: list[str] = []
     
@@ -1708,7 +1750,7 @@ def t_data_ng_views_table(args: NgViewsTable):
                     masked = f"[link]({link_url})"
                 else:
                     # Replace default label text with simple 'link'
-                    masked = re.sub(r"\[(Updated Neuroglancer view(?: \(\d+\))?)\]", "[link]", masked)
+                    masked = _MASKED_LABEL_RE.sub("[link]", masked)
                 record = {
                     id_column: row.get(id_column),
                     "link": link_url,
@@ -1818,7 +1860,7 @@ def t_data_ng_annotations_from_data(args: NgAnnotationsFromData):
             
             _dbg(f"Applying filter_expression: {filter_expression[:200]}")
             try:
-                namespace = {'pl': pl, 'df': df, '__builtins__': {}}
+                namespace = _eval_namespace(df)
                 result = eval(filter_expression, namespace, {})
                 
                 if isinstance(result, pl.DataFrame):
@@ -1873,19 +1915,16 @@ def t_data_ng_annotations_from_data(args: NgAnnotationsFromData):
             df = df.head(limit)
         
         # Create annotation layer if it doesn't exist, or ensure it exists with color
-        layer_exists = any(L.get("name") == layer_name and L.get("type") == "annotation" 
-                          for L in CURRENT_STATE.data.get("layers", []))
+        existing = CURRENT_STATE.get_layer(layer_name)
+        layer_exists = existing is not None and existing.get("type") == "annotation"
         
         if not layer_exists:
             CURRENT_STATE.add_layer(layer_name, "annotation", annotation_color=color)
             _dbg(f"Created annotation layer '{layer_name}' with color {color}")
         elif color:
             # Update color on existing layer
-            for L in CURRENT_STATE.data.get("layers", []):
-                if L.get("name") == layer_name and L.get("type") == "annotation":
-                    L["annotationColor"] = color
-                    _dbg(f"Updated color on existing layer '{layer_name}' to {color}")
-                    break
+            existing["annotationColor"] = color
+            _dbg(f"Updated color on existing layer '{layer_name}' to {color}")
         
         # Build annotation items from dataframe rows
         # Check if state has time dimension - if so, add 4th coordinate (default to 0)
@@ -2061,7 +2100,7 @@ def execute_plot(
         
         _dbg(f"Applying expression before plotting: {expression[:100]}")
         try:
-            namespace = {'pl': pl, 'df': df, '__builtins__': {}}
+            namespace = _eval_namespace(df)
             result = eval(expression, namespace, {})
             
             if isinstance(result, pl.DataFrame):
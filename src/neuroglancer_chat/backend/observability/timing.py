@@ -198,7 +198,8 @@ class TimingCollector:
     
     def __init__(self, user_prompt: str):
         self.request_id = str(uuid.uuid4())
-        self.start_time = time.perf_counter()
+        # Integer nanoseconds internally; converted to seconds once per record.
+        self._start_ns = time.perf_counter_ns()
         self.user_prompt = user_prompt[:100]  # Truncate for logging
         
         self.record = TimingRecord(
@@ -209,10 +210,15 @@ class TimingCollector:
         
         self._phase_starts: Dict[str, float] = {}
         self._current_iteration: Optional[IterationTiming] = None
+        self._agent_loop_start_ns = 0
     
+    def _elapsed_ns(self) -> int:
+        """Get elapsed nanoseconds since request start."""
+        return time.perf_counter_ns() - self._start_ns
+
     def _elapsed(self) -> float:
-        """Get elapsed time since request start."""
-        return time.perf_counter() - self.start_time
+        """Get elapsed time since request start, in seconds."""
+        return self._elapsed_ns() / 1e9
     
     def mark(self, event: str):
         """Mark a point in time event."""
@@ -225,13 +231,16 @@ class TimingCollector:
     @contextmanager
     def phase(self, phase_name: str):
         """Context manager for timing a phase."""
-        start = self._elapsed()
+        start_ns = self._elapsed_ns()
         try:
             yield
         finally:
-            end = self._elapsed()
-            duration = end - start
-            phase_timing = PhaseTiming(start=start, end=end, duration=duration)
+            end_ns = self._elapsed_ns()
+            phase_timing = PhaseTiming(
+                start=start_ns / 1e9,
+                end=end_ns / 1e9,
+                duration=(end_ns - start_ns) / 1e9,
+            )
             
             if phase_name == "prompt_assembly":
                 self.record.prompt_assembly = phase_timing
@@ -250,12 +259,14 @@ class TimingCollector:
     
     def start_agent_loop(self):
         """Mark start of agent loop."""
-        self.record.agent_loop_start = self._elapsed()
+        self._agent_loop_start_ns = self._elapsed_ns()
+        self.record.agent_loop_start = self._agent_loop_start_ns / 1e9
     
     def end_agent_loop(self):
         """Mark end of agent loop."""
-        self.record.agent_loop_end = self._elapsed()
-        self.record.agent_loop_duration = self.record.agent_loop_end - self.record.agent_loop_start
+        end_ns = self._elapsed_ns()
+        self.record.agent_loop_end = end_ns / 1e9
+        self.record.agent_loop_duration = (end_ns - self._agent_loop_start_ns) / 1e9
     
     def start_iteration(self, iteration_num: int) -> IterationTiming:
         """Start a new iteration."""
@@ -267,7 +278,8 @@ class TimingCollector:
     @contextmanager
     def llm_call(self, iteration: IterationTiming, model: str = ""):
         """Context manager for timing an LLM call."""
-        start = self._elapsed()
+        start_ns = self._elapsed_ns()
+        start = start_ns / 1e9
         
         class LLMContext:
             def __init__(self, timing_collector, iteration, start, model):
@@ -287,12 +299,11 @@ class TimingCollector:
         try:
             yield ctx
         finally:
-            end = self._elapsed()
-            duration = end - start
+            end_ns = self._elapsed_ns()
             iteration.llm_call = LLMTiming(
                 start=start,
-                end=end,
-                duration=duration,
+                end=end_ns / 1e9,
+                duration=(end_ns - start_ns) / 1e9,
                 model=ctx.model,
                 prompt_tokens=ctx.prompt_tokens,
                 completion_tokens=ctx.completion_tokens
@@ -301,7 +312,8 @@ class TimingCollector:
     @contextmanager
     def tool_execution(self, iteration: IterationTiming, tool_name: str):
         """Context manager for timing a tool execution."""
-        start = self._elapsed()
+        start_ns = self._elapsed_ns()
+        start = start_ns / 1e9
         
         class ToolContext:
             def __init__(self, timing_collector, iteration, start, tool_name):
@@ -321,13 +333,12 @@ class TimingCollector:
         try:
             yield ctx
         finally:
-            end = self._elapsed()
-            duration = end - start
+            end_ns = self._elapsed_ns()
             tool_timing = ToolTiming(
                 name=tool_name,
                 start=start,
-                end=end,
-                duration=duration,
+                end=end_ns / 1e9,
+                duration=(end_ns - start_ns) / 1e9,
                 args_size_bytes=ctx.args_size,
                 result_size_bytes=ctx.result_size
             )
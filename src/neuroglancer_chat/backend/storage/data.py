@@ -8,6 +8,8 @@ MAX_FILE_BYTES = 500 * 1024 * 1024  # 500 MB cap (matches uvicorn limit)
 
 
 class UploadedFileRecord:
+    __slots__ = ("file_id", "name", "size", "df")
+
     def __init__(self, file_id: str, name: str, size: int, df: pl.DataFrame):
         self.file_id = file_id
         self.name = name
@@ -26,6 +28,8 @@ class UploadedFileRecord:
 
 
 class SummaryRecord:
+    __slots__ = ("summary_id", "source_file_id", "kind", "df", "note")
+
     def __init__(
         self,
         summary_id: str,
@@ -54,6 +58,11 @@ class SummaryRecord:
 
 class PlotRecord:
     """Record of a generated plot with metadata."""
+    __slots__ = (
+        "plot_id", "source_id", "plot_type", "plot_html", "plot_spec",
+        "expression", "created_at",
+    )
+
     def __init__(
         self,
         plot_id: str,
@@ -1,6 +1,6 @@
 import json, os, uuid
 from typing import Dict, Any, Iterable
-from urllib.parse import quote, unquote
+from urllib.parse import quote_from_bytes, unquote
 
 
 #NEURO_BASE = os.getenv("NEUROGLANCER_BASE", "https://neuroglancer.github.io")
@@ -35,6 +35,11 @@ class NeuroglancerState:
             }
         self.data = data
 
+    # --- Layer lookup ----------------------------------------------------------
+    def get_layer(self, name: str) -> Dict | None:
+        """Return the first layer dict named ``name`` or ``None``."""
+        return next((l for l in self.data.get("layers", []) if l.get("name") == name), None)
+
     # --- Core mutation helpers -------------------------------------------------
     def set_view(self, center: Dict[str, float], zoom: Any, orientation: str | None):
         old_pos = self.data.get("position", [])
@@ -55,18 +60,17 @@ class NeuroglancerState:
         return self
 
     def set_lut(self, layer_name: str, vmin: float, vmax: float):
-        for L in self.data.get("layers", []):
-            if L.get("name") == layer_name:
-                sc = L.setdefault("shaderControls", {})
-                norm = sc.setdefault("normalized", {})
-                norm["range"] = [vmin, vmax]
-                break
+        L = self.get_layer(layer_name)
+        if L is not None:
+            sc = L.setdefault("shaderControls", {})
+            norm = sc.setdefault("normalized", {})
+            norm["range"] = [vmin, vmax]
         return self
 
     def add_layer(self, name: str, layer_type: str = "image", source: str | dict | None = None, **kwargs):
         if layer_type not in ALLOWED_LAYER_TYPES:
             raise ValueError(f"Unsupported layer_type '{layer_type}'. Allowed: {sorted(ALLOWED_LAYER_TYPES)}")
-        if any(L.get("name") == name for L in self.data.get("layers", [])):
+        if self.get_layer(name) is not None:
             return self  # idempotent
         
         # Special handling for annotation layers to match Neuroglancer's actual schema
@@ -110,10 +114,9 @@ class NeuroglancerState:
         return self
 
     def set_layer_visibility(self, name: str, visible: bool):
-        for L in self.data.get("layers", []):
-            if L.get("name") == name:
-                L["visible"] = bool(visible)
-                break
+        L = self.get_layer(name)
+        if L is not None:
+            L["visible"] = bool(visible)
         return self
 
     def add_annotations(self, layer: str, items: Iterable[Dict]):
@@ -123,11 +126,13 @@ class NeuroglancerState:
         - annotations array is at layer level (not in source)
         - each item must have 'type' field ('point', 'box', 'ellipsoid', etc.)
         """
-        ann = next((L for L in self.data.get("layers", []) if L.get("type") == "annotation" and L.get("name") == layer), None)
-        if not ann:
+        ann = self.get_layer(layer)
+        if ann is None:
             # Create layer if it doesn't exist
             self.add_layer(layer, "annotation")
-            ann = next((L for L in self.data.get("layers", []) if L.get("type") == "annotation" and L.get("name") == layer))
+            ann = self.get_layer(layer)
+        if ann.get("type") != "annotation":
+            raise ValueError(f"Layer '{layer}' exists but is not an annotation layer")
         
         # Ensure annotations array exists at layer level
         ann.setdefault("annotations", []).extend(items)
@@ -157,12 +162,53 @@ class NeuroglancerState:
     def to_url(self) -> str:
         return to_url(self.data)
 
+    def view_urls(self, centers: Iterable) -> list:
+        """Return one URL per ``(x, y, z)`` center, each re-centred on it.
+
+        Equivalent to ``clone().set_view(center, None, None).to_url()`` for every
+        center, but the state is serialized once with a placeholder position and
+        each URL only encodes its own position array. Centers containing
+        ``None`` (or values that cannot be encoded) yield ``""``.
+        """
+        template = self.clone()
+        template.set_view({"x": 0, "y": 0, "z": 0}, None, None)
+        tail = template.data["position"][3:]  # keep the time coordinate, if any
+        template.data["position"] = _POSITION_PLACEHOLDER
+        url = template.to_url()
+        marker = quote_from_bytes(_dumps_compact(_POSITION_PLACEHOLDER), safe="")
+        if url.count(marker) != 1:
+            # Placeholder text also occurs elsewhere in the state; do it the slow way.
+            return [self._view_url_slow(center) for center in centers]
+        prefix, _, suffix = url.partition(marker)
+        urls = []
+        for center in centers:
+            if any(v is None for v in center):
+                urls.append("")
+                continue
+            try:
+                position = _dumps_compact([*center, *tail])
+            except (TypeError, ValueError):
+                urls.append("")
+                continue
+            urls.append(prefix + quote_from_bytes(position, safe="") + suffix)
+        return urls
+
+    def _view_url_slow(self, center) -> str:
+        if any(v is None for v in center):
+            return ""
+        x, y, z = center
+        try:
+            return self.clone().set_view({"x": x, "y": y, "z": z}, None, None).to_url()
+        except (TypeError, ValueError):
+            return ""
+
     @staticmethod
     def from_url(url_or_fragment: str) -> "NeuroglancerState":
         return NeuroglancerState(from_url(url_or_fragment))
 
     # Convenience for tests / external callers wanting the raw dict
     def as_dict(self) -> Dict:
+        """Return the live state dict (not a copy); edits show up in ``to_url()``."""
         return self.data
 
     # --- Utility helpers ------------------------------------------------------
@@ -174,11 +220,17 @@ class NeuroglancerState:
         than serializing to a full Neuroglancer URL then parsing.
         """
         # json round-trip is adequate given the state is pure JSON-compatible primitives
-        import json as _json
-        return NeuroglancerState(_json.loads(_json.dumps(self.data)))
+        return NeuroglancerState(json.loads(json.dumps(self.data)))
 
 
 ALLOWED_LAYER_TYPES = {"image", "segmentation", "annotation"}
+# Stands in for the position array when view_urls serializes its template state.
+_POSITION_PLACEHOLDER = "__ng_chat_position__"
+
+
+def _dumps_compact(state: Dict) -> bytes:
+    """Compact JSON encoding of ``state`` that keeps dict insertion order."""
+    return json.dumps(state, separators=(",", ":")).encode("utf-8")
 
 
 def to_url(state) -> str:
@@ -211,8 +263,7 @@ def to_url(state) -> str:
     # CRITICAL: Do NOT use sort_keys=True here as it will reorder the dimensions
     # (e.g., x,y,z,t -> t,x,y,z) which breaks the position array mapping!
     # Python 3.7+ preserves dict insertion order, so we maintain the original dimension order.
-    state_str = json.dumps(state, separators=(",", ":"))
-    encoded = quote(state_str, safe="")
+    encoded = quote_from_bytes(_dumps_compact(state), safe="")
     # Neuroglancer canonical form uses '#!' before the JSON; include it.
     return f"{NEURO_BASE}#!{encoded}"
 
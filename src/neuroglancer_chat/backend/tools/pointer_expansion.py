@@ -23,6 +23,11 @@ except ImportError:
     _HAS_GCS = False
 
 
+# Bucket/key split for s3:// and gs:// pointers
+_S3_URL_RE = re.compile(r'^s3://([^/]+)/(.+)$')
+_GS_URL_RE = re.compile(r'^gs://([^/]+)/(.+)$')
+
+
 # -------- Core Helpers --------
 
 def _is_probably_json(text: str) -> bool:
@@ -53,28 +58,32 @@ def _fetch_http(url: str, http_get: Optional[Callable[[str], str]] = None) -> st
         return resp.read().decode('utf-8')
 
 
-def _fetch_s3(url: str) -> str:
-    """Fetch s3://bucket/key using boto3 (if available)."""
-    if not _HAS_BOTO3:
-        raise RuntimeError("boto3 not installed; install boto3 or provide a custom fetcher.")
-    m = re.match(r'^s3://([^/]+)/(.+)$', url)
+def _fetch_s3(url: str, client_factory: Optional[Callable[[], Any]] = None) -> str:
+    """Fetch s3://bucket/key using boto3 (if available) or a client from ``client_factory``."""
+    if client_factory is None:
+        if not _HAS_BOTO3:
+            raise RuntimeError("boto3 not installed; install boto3 or provide a custom fetcher.")
+        client_factory = lambda: boto3.client('s3')
+    m = _S3_URL_RE.match(url)
     if not m:
         raise ValueError(f"Not a valid s3 URL: {url}")
     bucket, key = m.group(1), m.group(2)
-    s3 = boto3.client('s3')
+    s3 = client_factory()
     obj = s3.get_object(Bucket=bucket, Key=key)
     return obj['Body'].read().decode('utf-8')
 
 
-def _fetch_gs(url: str) -> str:
-    """Fetch gs://bucket/key using google-cloud-storage (if available)."""
-    if not _HAS_GCS:
-        raise RuntimeError("google-cloud-storage not installed; install google-cloud-storage or provide a custom fetcher.")
-    m = re.match(r'^gs://([^/]+)/(.+)$', url)
+def _fetch_gs(url: str, client_factory: Optional[Callable[[], Any]] = None) -> str:
+    """Fetch gs://bucket/key using google-cloud-storage (if available) or ``client_factory``."""
+    if client_factory is None:
+        if not _HAS_GCS:
+            raise RuntimeError("google-cloud-storage not installed; install google-cloud-storage or provide a custom fetcher.")
+        client_factory = gcs.Client
+    m = _GS_URL_RE.match(url)
     if not m:
         raise ValueError(f"Not a valid gs URL: {url}")
     bucket_name, blob_name = m.group(1), m.group(2)
-    client = gcs.Client()
+    client = client_factory()
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(blob_name)
     return blob.download_as_text()
@@ -237,10 +246,14 @@ def is_pointer_url(url: str) -> bool:
     bool
         True if URL contains a pointer (s3://, gs://, http(s)://)
     """
-    if '#!' not in url:
+    idx = url.find('#!')
+    if idx == -1:
         return False
     
-    _, fragment = url.split('#!', 1)
+    fragment = url[idx + 2:]
+    # Fast reject: inline state starts with '{' (usually percent-encoded)
+    if fragment[:3] in ('%7B', '%7b') or fragment[:1] == '{':
+        return False
     decoded = _percent_decode(fragment)
     
     # Check if it's a pointer URL rather than inline JSON
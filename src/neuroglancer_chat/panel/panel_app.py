@@ -1,6 +1,6 @@
 import os, json, httpx, asyncio, re, panel as pn, io
+import functools
 from datetime import datetime
-from contextlib import contextmanager
 from panel.chat import ChatInterface
 from panel_neuroglancer import Neuroglancer
 import polars as pl
@@ -285,25 +285,75 @@ _views_table_watcher_added = False
 # --- Debounce & programmatic load tracking state ---
 _programmatic_load: bool = False  # True while we intentionally set viewer.url in code
 _last_user_state_sync: float = 0.0  # monotonic time of last backend sync caused by user interaction
-_scheduled_user_state_task: asyncio.Task | None = None  # pending delayed sync task
+_scheduled_user_state_sync: asyncio.TimerHandle | None = None  # pending delayed sync timer
+_pending_url: str | None = None  # latest user URL awaiting the scheduled sync
+_loop: asyncio.AbstractEventLoop | None = None  # Panel's event loop, captured on first URL change
+_loop_time = None  # bound _loop.time
 
-@contextmanager
-def _programmatic_viewer_update():
+
+def _validated_interval(value) -> int:
+    """Debounce interval in seconds from the widget value (min 1, default 5).
+
+    Accepts anything ``int()`` can coerce, since programmatic sets may pass
+    floats or numeric strings; empty or invalid values fall back to 5.
+    """
+    if value is None or value == "":
+        return 5
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 5
+
+
+# Kept in sync by a watcher so URL changes don't re-validate the widget value.
+_debounce_interval: int = _validated_interval(update_state_interval.value)
+
+
+def _on_interval_change(event):
+    global _debounce_interval
+    _debounce_interval = _validated_interval(event.new)
+
+
+update_state_interval.param.watch(_on_interval_change, 'value')
+
+
+def _cancel_pending_user_sync():
+    """Drop any debounced user sync so it can't later overwrite a newer programmatic state."""
+    global _scheduled_user_state_sync, _pending_url
+    if _scheduled_user_state_sync is not None:
+        _scheduled_user_state_sync.cancel()
+        _scheduled_user_state_sync = None
+    _pending_url = None
+
+
+class _ProgrammaticViewerUpdate:
     """Context manager marking a viewer.url change as programmatic.
 
     Programmatic (agent / app) initiated changes should sync immediately and not
     be throttled/debounced like rapid manual user edits in the Neuroglancer UI.
+    A single reusable instance flips the module flag; no generator per ``with``.
+    Entering also cancels any pending debounced user sync, which would otherwise
+    fire later with an older URL and revert the backend state.
     """
-    global _programmatic_load
-    _programmatic_load = True
-    try:
-        yield
-    finally:
+    __slots__ = ()
+
+    def __enter__(self):
+        global _programmatic_load
+        _programmatic_load = True
+        _cancel_pending_user_sync()
+        return self
+
+    def __exit__(self, *exc):
+        global _programmatic_load
         _programmatic_load = False
+        return False
+
+
+_programmatic_viewer_update = _ProgrammaticViewerUpdate()
 
 def _open_latest(_):
     if latest_url.value:
-        with _programmatic_viewer_update():
+        with _programmatic_viewer_update:
             viewer.url = latest_url.value
 
 open_latest_btn = pn.widgets.Button(name="Open latest link", button_type="primary")
@@ -356,6 +406,25 @@ async def _update_viewer_setting(setting_name: str, value):
     except Exception as e:
         logger.exception(f"Failed to update viewer setting {setting_name}")
 
+_state_sync_http: httpx.AsyncClient | None = None  # keep-alive client for URL-change syncs
+
+
+def _get_state_sync_client() -> httpx.AsyncClient:
+    """Session-lifetime client for state syncs (created lazily inside the running loop)."""
+    global _state_sync_http
+    if _state_sync_http is None or _state_sync_http.is_closed:
+        _state_sync_http = httpx.AsyncClient(base_url=BACKEND, timeout=60)
+    return _state_sync_http
+
+
+def _close_state_sync_client(session_context):
+    client = _state_sync_http
+    if client is not None and _loop is not None and not _loop.is_closed():
+        _loop.create_task(client.aclose())
+
+
+pn.state.on_session_destroyed(_close_state_sync_client)
+
 async def _notify_backend_state_load(url: str):
     """Inform backend that the widget loaded a new NG URL so CURRENT_STATE is in sync.
     
@@ -387,87 +456,91 @@ async def _notify_backend_state_load(url: str):
             "layout": viewer_layout.value
         }
         
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(
-                f"{BACKEND}/tools/state_load",
-                json={"link": sync_url, "default_settings": default_settings}
+        client = _get_state_sync_client()
+        resp = await client.post(
+            "/tools/state_load",
+            json={"link": sync_url, "default_settings": default_settings}
+        )
+        data = resp.json()
+        if not data.get("ok"):
+            status.object = f"Error syncing link: {data.get('error', 'unknown error')}"
+            return
+        
+        # If backend applied defaults, it returns an updated_url - reload viewer with it
+        updated_url = data.get("updated_url")
+        if updated_url and updated_url != sync_url:
+            logger.debug(f"Backend applied user's preferred defaults, reloading viewer with updated URL")
+            with _programmatic_viewer_update:
+                viewer.url = updated_url
+                viewer._load_url()
+        
+        # After successful load, fetch viewer settings and update widgets
+        # (This handles case where loaded URL already had some settings)
+        try:
+            summary_resp = await client.post(
+                "/tools/ng_state_summary",
+                json={"detail": "standard"}
             )
-            data = resp.json()
-            if not data.get("ok"):
-                status.object = f"Error syncing link: {data.get('error', 'unknown error')}"
-                return
-            
-            # If backend applied defaults, it returns an updated_url - reload viewer with it
-            updated_url = data.get("updated_url")
-            if updated_url and updated_url != sync_url:
-                logger.debug(f"Backend applied user's preferred defaults, reloading viewer with updated URL")
-                with _programmatic_viewer_update():
-                    viewer.url = updated_url
-                    viewer._load_url()
-            
-            # After successful load, fetch viewer settings and update widgets
-            # (This handles case where loaded URL already had some settings)
-            try:
-                summary_resp = await client.post(
-                    f"{BACKEND}/tools/ng_state_summary",
-                    json={"detail": "standard"}
-                )
-                if summary_resp.status_code == 200:
-                    summary_data = summary_resp.json()
-                    flags = summary_data.get("flags", {})
-                    layout = summary_data.get("layout", "xy")
-                    
-                    # Update widgets to match loaded state
-                    # (overrides user defaults if URL already had specific settings)
-                    viewer_show_scale_bar.value = flags.get("showScaleBar", True)
-                    viewer_show_annotations.value = flags.get("showDefaultAnnotations", False)
-                    viewer_show_axis_lines.value = flags.get("showAxisLines", False)
-                    viewer_layout.value = layout
-                    logger.debug(f"Synced viewer settings from loaded state: {flags}")
-            except Exception as sync_err:
-                logger.exception("Failed to sync viewer settings from backend after load")
+            if summary_resp.status_code == 200:
+                summary_data = summary_resp.json()
+                flags = summary_data.get("flags", {})
+                layout = summary_data.get("layout", "xy")
                 
+                # Update widgets to match loaded state
+                # (overrides user defaults if URL already had specific settings)
+                viewer_show_scale_bar.value = flags.get("showScaleBar", True)
+                viewer_show_annotations.value = flags.get("showDefaultAnnotations", False)
+                viewer_show_axis_lines.value = flags.get("showAxisLines", False)
+                viewer_layout.value = layout
+                logger.debug(f"Synced viewer settings from loaded state: {flags}")
+        except Exception as sync_err:
+            logger.exception("Failed to sync viewer settings from backend after load")
+            
         status.object = "✓ State loaded"
     except Exception as e:
         status.object = f"Error syncing: {e}"
 
 def _on_url_change(event):
     """Handle Neuroglancer URL changes with pointer expansion and debouncing."""
+    global _last_user_state_sync, _scheduled_user_state_sync, _loop, _loop_time, _pending_url
     new_url = event.new
     if not new_url:
         return
+    if _loop is None:
+        # Panel runs a single loop for the app lifetime; bind it once
+        _loop = asyncio.get_event_loop()
+        _loop_time = _loop.time
     
     # Immediate path for programmatic updates
     if _programmatic_load:
-        asyncio.create_task(_handle_url_change_immediate(new_url))
+        _cancel_pending_user_sync()
+        _loop.create_task(_handle_url_change_immediate(new_url))
         return
     
     # Debounce user-driven changes
-    global _last_user_state_sync, _scheduled_user_state_task
-    loop = asyncio.get_event_loop()
-    now = loop.time()
-    
-    try:
-        interval = max(1, int(update_state_interval.value or 5))
-    except Exception:
-        interval = 5
+    now = _loop_time()
+    interval = _debounce_interval
     
     elapsed = now - _last_user_state_sync
     if elapsed >= interval:
         _last_user_state_sync = now
-        asyncio.create_task(_handle_url_change_immediate(new_url))
+        _loop.create_task(_handle_url_change_immediate(new_url))
     else:
-        # Schedule one future call if not already scheduled
-        if _scheduled_user_state_task is None or _scheduled_user_state_task.done():
-            delay = interval - elapsed
-            async def _delayed_sync():
-                await asyncio.sleep(delay)
-                cur = viewer.url
-                if cur:
-                    global _last_user_state_sync
-                    _last_user_state_sync = loop.time()
-                    await _handle_url_change_immediate(cur)
-            _scheduled_user_state_task = asyncio.create_task(_delayed_sync())
+        # Coalesce: later URLs in the window only replace the payload of the
+        # single scheduled sync, which fires at the first arrival's deadline.
+        _pending_url = new_url
+        if _scheduled_user_state_sync is None:
+            _scheduled_user_state_sync = _loop.call_later(interval - elapsed, _fire_pending_sync)
+
+def _fire_pending_sync():
+    """Timer callback: sync the latest pending URL collected during the debounce window."""
+    global _last_user_state_sync, _scheduled_user_state_sync, _pending_url
+    cur = _pending_url or viewer.url
+    _pending_url = None
+    _scheduled_user_state_sync = None
+    if cur:
+        _last_user_state_sync = _loop_time()
+        _loop.create_task(_handle_url_change_immediate(cur))
 
 async def _handle_url_change_immediate(url: str):
     """Handle URL change immediately with pointer expansion and viewer update."""
@@ -477,7 +550,7 @@ async def _handle_url_change_immediate(url: str):
             canonical_url, state_dict, was_pointer = expand_if_pointer_and_generate_inline(url)
             if was_pointer:
                 # Update viewer with canonical URL to avoid re-triggering
-                with _programmatic_viewer_update():
+                with _programmatic_viewer_update:
                     viewer.url = canonical_url
                 # Sync the expanded state
                 await _notify_backend_state_load(canonical_url)
@@ -547,6 +620,21 @@ async def agent_call(prompt: str, history: list = None) -> dict:
 
 # Removed _truncate_table_columns - Tabulator handles wide tables with horizontal scrolling
 
+def _markdown_table_shape(text: str) -> tuple[int, int] | None:
+    """Return ``(data_rows, columns)`` of the table in ``text``, or None if there is none.
+
+    Counts pipes with ``str.count`` instead of splitting rows into cells; a
+    missing outer pipe on either side still counts as a cell boundary.
+    """
+    lines = _TABLE_LINE_RE.findall(text)
+    if len(lines) < 2:
+        return None
+    header = lines[0].strip()
+    n_cols = header.count("|") - 1 + (not header.startswith("|")) + (not header.endswith("|"))
+    n_rows = sum(1 for l in lines[2:] if not _TABLE_SEPARATOR_RE.fullmatch(l))
+    return n_rows, n_cols
+
+
 def _create_tabulator_from_query_data(query_data: dict) -> pn.widgets.Tabulator:
     """Create Tabulator widget directly from backend query_data structure.
     
@@ -586,7 +674,7 @@ def _create_tabulator_from_query_data(query_data: dict) -> pn.widgets.Tabulator:
     url_map = {view["row_index"]: view["url"] for view in ng_views if "row_index" in view and "url" in view}
     
     # Add _ng_url column for View buttons at the end
-    df['_ng_url'] = df.index.map(lambda i: url_map.get(i, ""))
+    df['_ng_url'] = df.index.map(url_map).fillna("")
     
     # Reorder columns to put _ng_url last
     cols = [c for c in df.columns if c != '_ng_url'] + ['_ng_url']
@@ -678,7 +766,7 @@ def _create_tabulator_from_markdown(text: str, ng_views: list = None, max_rows:
         df = df.drop(columns=['View'])
     
     # Add _ng_url column with URLs for button formatter
-    df['_ng_url'] = df.index.map(lambda i: url_map.get(i, ""))
+    df['_ng_url'] = df.index.map(url_map).fillna("")
     
     # Reorder columns to put _ng_url last
     cols = [c for c in df.columns if c != '_ng_url'] + ['_ng_url']
@@ -722,47 +810,57 @@ def _enhance_table_with_ng_views(text: str, ng_views: list) -> str:
     if not ng_views or not text:
         return text
     
-    # Create row_index -> url mapping
-    url_map = {view["row_index"]: view["url"] for view in ng_views if "row_index" in view and "url" in view}
-    if not url_map:
+    # Hashable row_index -> url pairs so identical re-renders hit the cache
+    url_pairs = tuple(
+        (view["row_index"], view["url"]) for view in ng_views if "row_index" in view and "url" in view
+    )
+    if not url_pairs:
         return text
-    
-    lines = text.split("\n")
-    enhanced_lines = []
-    in_table = False
+    return _enhance_table_cached(text, url_pairs)
+
+
+# Any line containing '|' is a table line; a separator row holds only |, -, : and spaces.
+_TABLE_LINE_RE = re.compile(r"^[^\n]*\|[^\n]*$", re.MULTILINE)
+_TABLE_SEPARATOR_RE = re.compile(r"[\s|:-]*")
+
+
+# Keys hold full answer texts and URL lists; only the last few re-renders repeat.
+@functools.lru_cache(maxsize=8)
+def _enhance_table_cached(text: str, url_pairs: tuple) -> str:
+    """Cached worker for _enhance_table_with_ng_views keyed on (text, url pairs).
+
+    Single ``re.sub`` pass over the table lines; non-table text is left in place.
+    """
+    url_map = dict(url_pairs)
+    prev_end = -2  # end offset of the previous table line
     table_row_idx = 0  # Track data rows (starts at 0 for first data row)
-    
-    for line in lines:
-        # Detect table by markdown syntax: | col1 | col2 |
-        if "|" in line:
-            parts = [p.strip() for p in line.split("|")]
-            # Filter empty parts from leading/trailing |
-            parts = [p for p in parts if p]
-            
-            if not in_table:
-                # First table row - add "View" header
-                in_table = True
-                table_row_idx = 0
-                enhanced_lines.append(line.rstrip() + " View |")
-            elif all(p.replace("-", "").replace(":", "").strip() == "" for p in parts):
-                # Separator row (---)
-                enhanced_lines.append(line.rstrip() + " --- |")
-            else:
-                # Data row - add link if available
-                if table_row_idx in url_map:
-                    url = url_map[table_row_idx]
-                    enhanced_lines.append(line.rstrip() + f" [view]({url}) |")
-                else:
-                    enhanced_lines.append(line.rstrip() + " - |")
-                table_row_idx += 1  # Increment AFTER using the index
-        else:
-            # Not a table line - reset table tracking
-            if in_table:
-                table_row_idx = 0
-            in_table = False
-            enhanced_lines.append(line)
-    
-    return "\n".join(enhanced_lines)
+
+    def add_view_cell(m: re.Match) -> str:
+        nonlocal prev_end, table_row_idx
+        line = m.group(0)
+        # A table line not directly following another one starts a new table
+        starts_table = m.start() != prev_end + 1
+        prev_end = m.end()
+        if starts_table:
+            # First table row - add "View" header
+            table_row_idx = 0
+            return line.rstrip() + " View |"
+        if _TABLE_SEPARATOR_RE.fullmatch(line):
+            # Separator row (---)
+            return line.rstrip() + " --- |"
+        # Data row - add link if available
+        row_idx = table_row_idx
+        table_row_idx += 1  # Increment AFTER using the index
+        if row_idx in url_map:
+            return line.rstrip() + f" [view]({url_map[row_idx]}) |"
+        return line.rstrip() + " - |"
+
+    return _TABLE_LINE_RE.sub(add_view_cell, text)
+
+
+# Raw Neuroglancer URLs NOT already inside markdown link syntax [text](url).
+# The negative lookbehind (?<!\]\() skips URLs right after "](".
+_NG_URL_RE = re.compile(r"(?<!\]\()https?://[^\s)]*neuroglancer[^\s)]*")
 
 
 def _mask_client_side(text: str) -> str:
@@ -773,17 +871,7 @@ def _mask_client_side(text: str) -> str:
     """
     if not text:
         return text
-    
-    # Pattern that matches raw URLs NOT already inside markdown link syntax [text](url)
-    # Negative lookbehind (?<!\]\() ensures we don't match URLs after ](
-    url_pattern = re.compile(r"(?<!\]\()https?://[^\s)]+")
-    
-    def repl(m):
-        u = m.group(0)
-        if 'neuroglancer' in u:
-            return f"[Updated Neuroglancer view]({u})"
-        return u
-    return url_pattern.sub(repl, text)
+    return _NG_URL_RE.sub(r"[Updated Neuroglancer view](\g<0>)", text)
 
 
 async def _process_status_updates():
@@ -895,7 +983,7 @@ def _update_agent_status(state: str = None, tools: list = None, prompt_tokens: i
 def _load_internal_link(url: str):
     if not url:
         return
-    with _programmatic_viewer_update():
+    with _programmatic_viewer_update:
         viewer.url = url
         viewer._load_url()
     # Sync handled by _on_url_change in programmatic context
@@ -927,7 +1015,7 @@ def _handle_state_link_auto_load(mutated: bool, state_link: dict, link: str = No
     latest_url.value = link_url
     
     if link_url != last_loaded_url and auto_load_checkbox.value:
-        with _programmatic_viewer_update():
+        with _programmatic_viewer_update:
             viewer.url = link_url
             viewer._load_url()
         last_loaded_url = link_url
@@ -2065,11 +2153,9 @@ def _add_result_to_workspace(full_table_text: str, ng_views_data: list = None, q
     
     # Count rows and columns from table
     if not query_summary:
-        lines = [l for l in full_table_text.split("\n") if "|" in l]
-        if len(lines) >= 2:
-            header_parts = [p.strip() for p in lines[0].split("|") if p.strip()]
-            data_lines = [l for l in lines[2:] if not all(c in "-:|" for c in l.replace(" ", ""))]
-            query_summary = f"{len(data_lines)} rows × {len(header_parts)} columns"
+        shape = _markdown_table_shape(full_table_text)
+        if shape:
+            query_summary = f"{shape[0]} rows × {shape[1]} columns"
     
     # Create card content with Tabulator widget
     tabulator_widget = _create_tabulator_from_markdown(full_table_text, ng_views_data)
@@ -1,6 +1,9 @@
+import io
 import sys
 from pathlib import Path
 
+import pytest
+
 
 def _ensure_src_path():
     """Add project src/ to sys.path for imports when running tests without install."""
@@ -13,3 +16,64 @@ def _ensure_src_path():
 
 
 _ensure_src_path()
+
+_CSV_BYTES = b"cell_id,x,y,z,volume\n1,100,200,50,1000\n2,150,250,60,1200\n3,200,300,70,800\n"
+
+
+def _df_to_csv_bytes(df) -> bytes:
+    """Serialize a Polars DataFrame straight to CSV bytes without a str round-trip."""
+    buf = io.BytesIO()
+    df.write_csv(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="session")
+def backend_app():
+    """The backend FastAPI app, imported on first use rather than at collection."""
+    from neuroglancer_chat.backend.main import app
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(backend_app):
+    """One TestClient for the whole session so app lifespan runs once."""
+    from fastapi.testclient import TestClient
+
+    with TestClient(backend_app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def small_cells_file_id():
+    """Register a 10-row cells CSV in DATA_MEMORY once per module and return its file_id."""
+    import polars as pl
+    from neuroglancer_chat.backend.main import DATA_MEMORY
+
+    df = pl.DataFrame({
+        "cell_id": list(range(1, 11)),
+        "x": [10 + i for i in range(10)],
+        "y": [20 + i for i in range(10)],
+        "z": [30 + i for i in range(10)],
+        "mean_intensity": [5.5 + i for i in range(10)],
+    })
+    return DATA_MEMORY.add_file("cells.csv", _df_to_csv_bytes(df))["file_id"]
+
+
+@pytest.fixture(scope="session")
+def uploaded_file(client):
+    """Upload a 3-row cells CSV through /upload_file once per session and return its file_id.
+
+    Tests must not clear ``DATA_MEMORY.files`` or the cached upload disappears.
+    """
+    response = client.post("/upload_file", files={"file": ("test.csv", _CSV_BYTES, "text/csv")})
+    assert response.status_code == 200
+    return response.json()["file"]["file_id"]
+
+
+@pytest.fixture(scope="session")
+def default_state_url():
+    """URL of the default NeuroglancerState, serialized once per session."""
+    from neuroglancer_chat.backend.tools.neuroglancer_state import NeuroglancerState
+
+    return NeuroglancerState().to_url()
@@ -1,14 +1,19 @@
 """Tests for annotation layer schema, adding points, and color customization."""
 
 import json
-from urllib.parse import unquote
+from urllib.parse import unquote_to_bytes
 
-from fastapi.testclient import TestClient
+import pytest
 
-from neuroglancer_chat.backend.main import app, CURRENT_STATE, _execute_tool_by_name
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    import json as _json
+
+from neuroglancer_chat.backend.main import CURRENT_STATE, _execute_tool_by_name
 from neuroglancer_chat.backend.tools.neuroglancer_state import NeuroglancerState
 
-client = TestClient(app)
+pytestmark = pytest.mark.xdist_group(name="ng_state")
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -23,13 +28,19 @@ _RESET_STATE = {
     "position": [0, 0, 0],
     "layers": [],
 }
+_RESET_STATE_JSON = json.dumps(_RESET_STATE)
 
 
+@pytest.fixture(autouse=True)
 def _reset():
     """Reset global state before each test."""
-    import copy
+    CURRENT_STATE.data = json.loads(_RESET_STATE_JSON)
+
 
-    CURRENT_STATE.data = copy.deepcopy(_RESET_STATE)
+def _decode_state_url(url: str) -> dict:
+    """Decode the JSON state embedded in a ``#!`` Neuroglancer URL."""
+    fragment = url.split("#!", 1)[1]
+    return _json.loads(unquote_to_bytes(fragment))
 
 
 # ---------------------------------------------------------------------------
@@ -52,7 +63,7 @@ def test_annotation_layer_has_required_fields():
             }
         ],
     )
-    layer = next(l for l in state.data["layers"] if l["name"] == "AnnTest")
+    layer = state.get_layer("AnnTest")
 
     assert layer["type"] == "annotation"
     assert "url" in layer["source"]
@@ -72,7 +83,7 @@ def test_annotation_item_has_type_and_point_fields():
         "TestAnn",
         [{"point": [100, 200, 300], "type": "point", "id": "test-id-123"}],
     )
-    layer = next(l for l in state.data["layers"] if l["name"] == "TestAnn")
+    layer = state.get_layer("TestAnn")
     ann = layer["annotations"][0]
 
     assert "point" in ann
@@ -85,10 +96,8 @@ def test_annotation_item_has_type_and_point_fields():
 # ---------------------------------------------------------------------------
 
 
-def test_annotation_add_and_serialization():
+def test_annotation_add_and_serialization(client):
     """ng_annotations_add stores points and they survive URL serialization."""
-    _reset()
-
     client.post(
         "/tools/ng_add_layer",
         json={"name": "TestPoints", "layer_type": "annotation"},
@@ -113,25 +122,61 @@ def test_annotation_add_and_serialization():
     assert r.status_code == 200
     assert r.json().get("ok") is True
 
-    layer = next(
-        l for l in CURRENT_STATE.data["layers"] if l["name"] == "TestPoints"
-    )
+    layer = CURRENT_STATE.get_layer("TestPoints")
     assert len(layer["annotations"]) == 2
 
     # Verify round-trip through URL serialization
     url = CURRENT_STATE.to_url()
-    fragment = url.split("#!")[1]
-    state_dict = json.loads(unquote(fragment))
-    saved_layer = next(
-        l for l in state_dict["layers"] if l["name"] == "TestPoints"
-    )
+    saved_layer = NeuroglancerState(_decode_state_url(url)).get_layer("TestPoints")
     assert len(saved_layer["annotations"]) == 2
 
 
-def test_annotation_add_creates_layer_if_missing():
-    """ng_annotations_add succeeds even when the layer doesn't exist yet."""
-    _reset()
+def test_large_annotation_layer_serialization_round_trip():
+    """A large annotation layer round-trips intact through the state URL."""
+    n = 2007
+    state = NeuroglancerState(json.loads(_RESET_STATE_JSON))
+    state.add_layer("Big", "annotation")
+    state.add_annotations(
+        "Big",
+        [{"point": [i, i + 0.5, 2 * i], "type": "point", "id": f"p{i}"} for i in range(n)],
+    )
+    state.add_layer("Img", "image", source="precomputed://example")
+
+    state_dict = _decode_state_url(state.to_url())
+    assert state_dict == state.as_dict()
+    assert [l["name"] for l in state_dict["layers"]] == ["Big", "Img"]
+    anns = state_dict["layers"][0]["annotations"]
+    assert len(anns) == n
+    assert anns[1000]["id"] == "p1000"
+    assert anns[-1]["point"] == [n - 1, n - 0.5, 2 * (n - 1)]
+
 
+def test_annotation_add_large_mixed_batch(client):
+    """A single request with many point/box/ellipsoid items is converted in one pass."""
+    kinds = ("point", "box", "ellipsoid")
+    n = 300
+    items = [
+        {
+            "type": kinds[i % 3],
+            "center": {"x": i, "y": 2 * i, "z": 3 * i},
+            "size": {"x": 2, "y": 4, "z": 6},
+            "id": f"a{i}",
+        }
+        for i in range(n)
+    ]
+    r = client.post("/tools/ng_annotations_add", json={"layer": "Batch", "items": items})
+    assert r.status_code == 200
+    assert r.json() == {"ok": True, "n_annotations": n}
+
+    anns = CURRENT_STATE.get_layer("Batch")["annotations"]
+    assert len(anns) == n
+    assert anns[0] == {"point": [0, 0, 0], "type": "point", "id": "a0"}
+    assert anns[1] == {"type": "box", "point": [1, 2, 3], "size": [2, 4, 6], "id": "a1"}
+    assert anns[2] == {"type": "ellipsoid", "center": [2, 4, 6], "radii": [1, 2, 3], "id": "a2"}
+
+
+def test_annotation_add_creates_layer_if_missing(client):
+    """ng_annotations_add succeeds even when the layer doesn't exist yet."""
     r = client.post(
         "/tools/ng_annotations_add",
         json={
@@ -149,55 +194,23 @@ def test_annotation_add_creates_layer_if_missing():
 # ---------------------------------------------------------------------------
 
 
-def test_annotation_layer_custom_color():
-    """ng_add_layer stores the annotation_color on the layer."""
-    _reset()
-
-    client.post(
-        "/tools/ng_add_layer",
-        json={
-            "name": "GreenAnnotations",
-            "layer_type": "annotation",
-            "annotation_color": "#00ff00",
-        },
-    )
-    layer = next(
-        l for l in CURRENT_STATE.data["layers"] if l["name"] == "GreenAnnotations"
-    )
-    assert layer["annotationColor"] == "#00ff00"
-
-
-def test_annotation_layer_default_color():
-    """ng_add_layer applies the default color when annotation_color is omitted."""
-    _reset()
-
-    client.post(
-        "/tools/ng_add_layer",
-        json={"name": "DefaultAnnotations", "layer_type": "annotation"},
-    )
-    layer = next(
-        l
-        for l in CURRENT_STATE.data["layers"]
-        if l["name"] == "DefaultAnnotations"
-    )
-    assert layer["annotationColor"] == "#cecd11"
-
-
-def test_annotation_layer_color_via_dispatcher():
-    """Color is correctly set when the layer is created through the tool dispatcher."""
-    _reset()
-
-    _execute_tool_by_name(
-        "ng_add_layer",
-        {
-            "name": "BlueAnnotations",
-            "layer_type": "annotation",
-            "annotation_color": "#0000ff",
-        },
-    )
-    layer = next(
-        l
-        for l in CURRENT_STATE.data["layers"]
-        if l["name"] == "BlueAnnotations"
-    )
-    assert layer["annotationColor"] == "#0000ff"
+@pytest.mark.parametrize(
+    "name, color, via_dispatcher, expected",
+    [
+        ("GreenAnnotations", "#00ff00", False, "#00ff00"),
+        ("DefaultAnnotations", None, False, "#cecd11"),
+        ("BlueAnnotations", "#0000ff", True, "#0000ff"),
+    ],
+    ids=["custom", "default", "dispatcher"],
+)
+def test_annotation_layer_color(client, name, color, via_dispatcher, expected):
+    """ng_add_layer stores annotation_color (or the default) via HTTP and the dispatcher."""
+    args = {"name": name, "layer_type": "annotation"}
+    if color is not None:
+        args["annotation_color"] = color
+    if via_dispatcher:
+        _execute_tool_by_name("ng_add_layer", args)
+    else:
+        client.post("/tools/ng_add_layer", json=args)
+    layer = CURRENT_STATE.get_layer(name)
+    assert layer["annotationColor"] == expected
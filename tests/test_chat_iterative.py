@@ -1,42 +1,44 @@
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app, DATA_MEMORY, CURRENT_STATE
+import pytest
+
+from neuroglancer_chat.backend import main as backend_main
 from neuroglancer_chat.backend.tools.neuroglancer_state import NeuroglancerState
 
-client = TestClient(app)
+pytestmark = pytest.mark.xdist_group(name="ng_state")
+
+_MINI_CSV = b"id,val\n1,10\n2,20\n3,30\n"
 
 
-def _upload_small_csv():
-    content = b"id,val\n1,10\n2,20\n3,30\n"
-    r = client.post("/upload_file", files={"file": ("mini.csv", content, "text/csv")})
+def _upload_small_csv(client):
+    r = client.post("/upload_file", files={"file": ("mini.csv", _MINI_CSV, "text/csv")})
     assert r.status_code == 200, r.text
     j = r.json()
     assert j.get("ok") is True, j
     return j["file"]["file_id"]
 
 
-def test_data_info_non_mutating_no_link(monkeypatch):
-    fid = _upload_small_csv()
+def _scripted_run_chat(*responses):
+    """Return a fake run_chat that yields the given responses in order."""
+    it = iter(responses)
+    return lambda msgs: next(it)
 
-    # Monkeypatch run_chat to simulate a single tool call then final answer.
-    from neuroglancer_chat.backend import adapters
 
-    calls = []
+def test_data_info_non_mutating_no_link(client, monkeypatch):
+    fid = _upload_small_csv(client)
 
-    def fake_run_chat(msgs):  # first call returns tool call, second returns answer
-        iteration = len([m for m in msgs if m.get("role") == "assistant"])  # crude
-        if iteration == 0:
-            return {
-                "choices": [
-                    {"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [
-                        {"id": "tc1", "type": "function", "function": {"name": "data_info", "arguments": f"{{\"file_id\": \"{fid}\"}}"}}
-                    ]}}
-                ]
-            }
-        else:
-            # Second pass: no tool calls, model summarizes
-            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "File has 3 rows."}}]}
-
-    monkeypatch.setattr(adapters.llm, "run_chat", fake_run_chat)
+    # First call returns a tool call, second returns the final answer.
+    fake_run_chat = _scripted_run_chat(
+        {
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [
+                    {"id": "tc1", "type": "function", "function": {"name": "data_info", "arguments": f"{{\"file_id\": \"{fid}\"}}"}}
+                ]}}
+            ]
+        },
+        # Second pass: no tool calls, model summarizes
+        {"choices": [{"index": 0, "message": {"role": "assistant", "content": "File has 3 rows."}}]},
+    )
+    # main imports run_chat by name, so patch it where it is looked up.
+    monkeypatch.setattr(backend_main, "run_chat", fake_run_chat)
 
     resp = client.post("/agent/chat", json={"messages": [{"role": "user", "content": f"How many rows in file {fid}?"}]})
     j = resp.json()
@@ -45,22 +47,17 @@ def test_data_info_non_mutating_no_link(monkeypatch):
     assert "3" in (j["choices"][0]["message"]["content"])  # uses tool result
 
 
-def test_mutating_tool_returns_link(monkeypatch):
-    # Reset state (optional for clarity)
-    from neuroglancer_chat.backend import main as backend_main
-    backend_main.CURRENT_STATE = NeuroglancerState()
-
-    def fake_run_chat(msgs):
-        iteration = len([m for m in msgs if m.get("role") == "assistant"])  # same tactic
-        if iteration == 0:
-            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [
-                {"id": "tc1", "type": "function", "function": {"name": "ng_set_view", "arguments": "{\"center\": {\"x\":1,\"y\":2,\"z\":3}, \"zoom\": \"fit\", \"orientation\": \"xy\"}"}}
-            ]}}]}
-        else:
-            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "View updated."}}]}
+def test_mutating_tool_returns_link(client, monkeypatch):
+    # Fresh state for this test only; restored afterwards by monkeypatch
+    monkeypatch.setattr(backend_main, "CURRENT_STATE", NeuroglancerState())
 
-    from neuroglancer_chat.backend import adapters
-    monkeypatch.setattr(adapters.llm, "run_chat", fake_run_chat)
+    fake_run_chat = _scripted_run_chat(
+        {"choices": [{"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [
+            {"id": "tc1", "type": "function", "function": {"name": "ng_set_view", "arguments": "{\"center\": {\"x\":1,\"y\":2,\"z\":3}, \"zoom\": \"fit\", \"orientation\": \"xy\"}"}}
+        ]}}]},
+        {"choices": [{"index": 0, "message": {"role": "assistant", "content": "View updated."}}]},
+    )
+    monkeypatch.setattr(backend_main, "run_chat", fake_run_chat)
 
     resp = client.post("/agent/chat", json={"messages": [{"role": "user", "content": "Center on 1 2 3."}]})
     j = resp.json()
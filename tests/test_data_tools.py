@@ -1,14 +1,26 @@
 import polars as pl
-from fastapi.testclient import TestClient
+import pytest
 
-from neuroglancer_chat.backend.main import app, execute_query_polars, DATA_MEMORY
+from neuroglancer_chat.backend.main import execute_query_polars, DATA_MEMORY
 from neuroglancer_chat.backend.storage.data import UploadedFileRecord
 
-client = TestClient(app)
+pytestmark = pytest.mark.xdist_group(name="data_memory")
 
 CSV_CONTENT = b"id,x,y,z,size_x,size_y,size_z\n1,1,2,3,4,5,6\n2,2,3,4,5,6,7\n"
 
-def test_upload_and_list_files():
+
+def _seed(name: str) -> str:
+    """Register CSV_CONTENT in DATA_MEMORY directly, bypassing /upload_file."""
+    return DATA_MEMORY.add_file(name, CSV_CONTENT)["file_id"]
+
+
+@pytest.fixture(scope="module")
+def uploaded_fid():
+    """Seed CSV_CONTENT once per module and return its file_id."""
+    return _seed("t2.csv")
+
+
+def test_upload_and_list_files(client):
     resp = client.post("/upload_file", files={"file": ("test.csv", CSV_CONTENT, "text/csv")})
     data = resp.json()
     assert data["ok"], data
@@ -18,9 +30,8 @@ def test_upload_and_list_files():
     assert any(f["file_id"] == fid for f in lst["files"])
 
 
-def test_preview_and_describe():
-    resp = client.post("/upload_file", files={"file": ("t2.csv", CSV_CONTENT, "text/csv")}).json()
-    fid = resp["file"]["file_id"]
+def test_preview_and_describe(client, uploaded_fid):
+    fid = uploaded_fid
     prev = client.post("/tools/data_preview", json={"file_id": fid, "n": 1}).json()
     assert prev["rows"] and len(prev["rows"]) == 1
     desc = client.post("/tools/data_describe", json={"file_id": fid}).json()
@@ -28,25 +39,22 @@ def test_preview_and_describe():
     assert desc["rows"], desc
 
 
-def test_list_summaries():
+def test_list_summaries(client):
     # Ensure at least one summary from previous tests
     resp = client.post("/tools/data_list_summaries").json()
     assert "summaries" in resp
 
 
-def test_data_ng_views_table_basic():
-    # Build a dataframe with required columns
-    content = b"cell_id,x,y,z,mean_intensity\n1,10,20,30,5.5\n2,11,21,31,6.5\n3,12,22,32,7.5\n"
-    resp = client.post("/upload_file", files={"file": ("cells.csv", content, "text/csv")}).json()
-    fid = resp["file"]["file_id"]
+def test_data_ng_views_table_basic(client, small_cells_file_id):
     mv = client.post("/tools/data_ng_views_table", json={
-        "file_id": fid,
+        "file_id": small_cells_file_id,
         "sort_by": "mean_intensity",
         "top_n": 2,
         "include_columns": ["mean_intensity"],
     }).json()
     assert mv.get("n") == 2, mv
-    assert mv["rows"][0]["cell_id"] in (1,2,3)
+    # Sorted by mean_intensity descending: cell 10 has the highest value
+    assert [r["cell_id"] for r in mv["rows"]] == [10, 9]
     assert "link" in mv["rows"][0]
     assert mv.get("first_link") == mv["rows"][0]["link"], mv
     assert "summary" in mv, mv
@@ -65,21 +73,25 @@ def _add_test_file(name: str = "qtest.csv") -> str:
     return meta["file_id"]
 
 
-def test_execute_query_polars_filter():
+@pytest.fixture(scope="module")
+def query_fid() -> str:
+    """Ingest _QUERY_CSV once per module for the read-only query tests."""
+    return _add_test_file("qtest.csv")
+
+
+def test_execute_query_polars_filter(query_fid):
     """execute_query_polars filters rows correctly."""
-    fid = _add_test_file("qtest_filter.csv")
     result = execute_query_polars(
-        file_id=fid, expression='df.filter(pl.col("value") > 20)'
+        file_id=query_fid, expression='df.filter(pl.col("value") > 20)'
     )
     assert result.get("ok") is True
     assert result.get("rows") == 3
 
 
-def test_execute_query_polars_aggregation():
+def test_execute_query_polars_aggregation(query_fid):
     """execute_query_polars handles aggregation expressions."""
-    fid = _add_test_file("qtest_agg.csv")
     result = execute_query_polars(
-        file_id=fid,
+        file_id=query_fid,
         expression='df.select([pl.max("value").alias("max_value"), pl.mean("value").alias("mean_value")])',
     )
     assert result.get("ok") is True
@@ -99,3 +111,18 @@ def test_execute_query_polars_auto_select():
     _add_test_file("qtest_autoselect.csv")
     result = execute_query_polars(expression='df.select([pl.col("id")])')
     assert result.get("ok") is True
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        'df.lazy().filter(pl.col("value") > 20).collect()',
+        'df.lazy().filter(pl.col("value") > 20).cache().collect()',
+    ],
+    ids=["lazy-collect", "lazy-only-method"],
+)
+def test_execute_query_polars_lazy_expressions(query_fid, expression):
+    """Lazy queries run as written, including chains only a LazyFrame supports."""
+    result = execute_query_polars(file_id=query_fid, expression=expression)
+    assert result.get("ok") is True
+    assert result.get("rows") == 3
@@ -5,9 +5,13 @@ to the dimension order in the dimensions object. If dimensions get reordered
 (e.g., x,y,z,t -> t,x,y,z), the position values get mapped to the wrong axes.
 """
 import json
-from urllib.parse import unquote
+from urllib.parse import unquote_to_bytes
+
+import pytest
 from neuroglancer_chat.backend.tools.neuroglancer_state import NeuroglancerState, to_url, from_url
 
+pytestmark = pytest.mark.xdist_group(name="dimension_order")
+
 
 def test_dimension_order_preserved_in_serialization():
     """Verify that dimension order is maintained during to_url serialization."""
@@ -32,8 +36,7 @@ def test_dimension_order_preserved_in_serialization():
     
     # Extract and decode the JSON from the URL
     fragment = url.split('#!')[1]
-    decoded_json = unquote(fragment)
-    parsed = json.loads(decoded_json)
+    parsed = json.loads(unquote_to_bytes(fragment))
     
     # Check that dimension order is preserved (should be x, y, z, t, NOT t, x, y, z)
     dimension_keys = list(parsed["dimensions"].keys())
@@ -96,16 +99,11 @@ def test_set_view_preserves_dimension_order():
     # Modify view position
     state.set_view({"x": 500, "y": 600, "z": 700}, zoom=5.0, orientation="xy")
     
-    # Serialize and check dimension order
-    url = to_url(state)
-    fragment = url.split('#!')[1]
-    decoded_json = unquote(fragment)
-    parsed = json.loads(decoded_json)
-    
-    dimension_keys = list(parsed["dimensions"].keys())
+    # Serialization order is covered above; inspect the state dict directly
+    dimension_keys = list(state.data["dimensions"].keys())
     assert dimension_keys == ["x", "y", "z", "t"], \
         f"set_view corrupted dimension order: {dimension_keys}"
     
-    # Verify position was updated correctly
-    assert parsed["position"][:3] == [500, 600, 700], \
+    # Verify position was updated correctly (time component preserved)
+    assert state.data["position"] == [500, 600, 700, 0], \
         "Position not updated correctly by set_view"
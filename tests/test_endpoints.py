@@ -1,11 +1,9 @@
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app
+import pytest
 
+pytestmark = pytest.mark.xdist_group(name="ng_state")
 
-client = TestClient(app)
 
-
-def test_set_view_and_state_save():
+def test_set_view_and_state_save(client):
     # set view
     payload = {
         "center": {"x": 1, "y": 2, "z": 3},
@@ -24,7 +22,7 @@ def test_set_view_and_state_save():
     assert isinstance(data["url"], str) and data["url"].startswith("http")
 
 
-def test_add_annotations_and_histogram():
+def test_add_annotations_and_histogram(client):
     # add a point annotation
     payload = {
         "layer": "ROIs",
@@ -55,3 +53,18 @@ def test_add_annotations_and_histogram():
     assert "hist" in data and "edges" in data
     assert len(data["hist"]) == 256
     assert len(data["edges"]) == 257
+
+
+def test_orjson_response_matches_stdlib_encoding():
+    import json
+
+    from fastapi.responses import JSONResponse
+    from neuroglancer_chat.backend.main import _ORJSONResponse
+
+    payload = {"ok": True, "rows": [{"id": 1, "x": 1e-9, "name": "café"}], "url": None}
+    assert json.loads(_ORJSONResponse(payload).body) == json.loads(JSONResponse(payload).body)
+
+    # Non-finite floats: orjson writes null, the stdlib path refuses them
+    assert json.loads(_ORJSONResponse({"v": float("nan")}).body) == {"v": None}
+    with pytest.raises(ValueError):
+        JSONResponse({"v": float("nan")})
@@ -7,6 +7,10 @@ Tests the full flow:
 3. Verify data_query_polars is called
 4. Verify query_data is returned with structured data
 5. Verify ng_views are generated for spatial data
+
+Runs against the app in-process by default; set BACKEND=http://host:port to
+exercise a running server over real HTTP instead. Either way the agent needs
+an LLM key, so the module stays behind the ``integration`` marker.
 """
 import pytest
 import httpx
@@ -14,27 +18,64 @@ import json
 import os
 from pathlib import Path
 
+from fastapi.testclient import TestClient
+
 
 # Locate the example CSV file
 EXAMPLE_CSV = Path(__file__).parent.parent / "src" / "neuroglancer_chat" / "examples" / "767018_inh_cells_shape_metrics_clusters.csv"
-BACKEND_URL = os.environ.get("BACKEND", "http://127.0.0.1:8000")
+BACKEND_URL = os.environ.get("BACKEND")  # unset -> in-process TestClient
+# Set by pytest-xdist ("gw0", "gw1", ...); keeps each worker's uploads apart.
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+_BAR60 = "=" * 60
 
+pytestmark = pytest.mark.integration
 
-@pytest.fixture
-def backend_client():
-    """Create HTTP client for backend."""
-    return httpx.Client(base_url=BACKEND_URL, timeout=60.0)
 
+def _upload_example_csv(client, filename="test_cells.csv"):
+    """POST the example CSV to /upload_file and return the response.
 
-def test_upload_and_query_largest_cells_per_cluster(backend_client):
-    """Test full workflow: upload CSV and query largest cells per cluster."""
-    
-    # Step 1: Upload CSV file
+    The open file handle (never ``f.read()``) is passed to httpx, which streams
+    it into the multipart body in 64 KiB chunks instead of buffering the file.
+    """
     assert EXAMPLE_CSV.exists(), f"Example CSV not found at {EXAMPLE_CSV}"
-    
     with open(EXAMPLE_CSV, "rb") as f:
-        files = {"file": ("test_cells.csv", f, "text/csv")}
-        upload_resp = backend_client.post("/upload_file", files=files)
+        files = {"file": (filename, f, "text/csv")}
+        return client.post("/upload_file", files=files)
+
+
+def _make_backend_client(app=None):
+    if BACKEND_URL:
+        return httpx.Client(base_url=BACKEND_URL, timeout=60.0)
+    if app is None:
+        from neuroglancer_chat.backend.main import app
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def backend_client(request):
+    """Backend client shared by every test in the session.
+
+    In-process runs reuse the session ``client`` from conftest instead of
+    starting a second TestClient (and app lifespan).
+    """
+    if not BACKEND_URL:
+        yield request.getfixturevalue("client")
+        return
+    with _make_backend_client() as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def uploaded_file_id(backend_client):
+    """Upload the example CSV once per session and return its file_id."""
+    upload_resp = _upload_example_csv(backend_client, f"test_cells_{WORKER_ID}.csv")
+    assert upload_resp.status_code == 200, f"Upload failed: {upload_resp.text}"
+    return upload_resp.json()["file"]["file_id"]
+
+
+def test_upload_example_csv(backend_client):
+    """Uploading the example CSV reports the expected columns."""
+    upload_resp = _upload_example_csv(backend_client, f"upload_check_{WORKER_ID}.csv")
     
     assert upload_resp.status_code == 200, f"Upload failed: {upload_resp.text}"
     upload_data = upload_resp.json()
@@ -49,8 +90,13 @@ def test_upload_and_query_largest_cells_per_cluster(backend_client):
     assert 'log_volume' in columns, "Missing log_volume column"
     assert 'cluster_label' in columns, "Missing cluster_label column"
     assert 'centroid_x' in columns or 'x' in columns, "Missing spatial x column"
+
+
+def test_upload_and_query_largest_cells_per_cluster(backend_client, uploaded_file_id):
+    """Test full workflow: query largest cells per cluster in the uploaded CSV."""
+    file_id = uploaded_file_id
     
-    # Step 2: Send query to agent
+    # Send query to agent
     query = "Give me the largest cells (by log_volume) in each cluster_label"
     chat_payload = {
         "messages": [
@@ -153,9 +199,9 @@ def test_upload_and_query_largest_cells_per_cluster(backend_client):
     print(f"\n✅ Tool trace validated")
     print(f"   Tools called: {tool_names}")
     
-    print(f"\n" + "="*60)
+    print("\n" + _BAR60)
     print(f"✅ INTEGRATION TEST PASSED")
-    print(f"="*60)
+    print(_BAR60)
     print(f"Summary:")
     print(f"  - Uploaded CSV: {file_id}")
     print(f"  - Query returned {rows} results (one per cluster)")
@@ -164,15 +210,12 @@ def test_upload_and_query_largest_cells_per_cluster(backend_client):
     print(f"  - Frontend will render as Tabulator widget with View buttons")
 
 
-def test_query_without_upload_uses_most_recent(backend_client):
+# "Most recent file" is backend-global, so keep this on a single xdist worker.
+@pytest.mark.xdist_group(name="most_recent")
+def test_query_without_upload_uses_most_recent(backend_client, uploaded_file_id):
     """Test that queries without file_id auto-use most recent file."""
     
-    # Upload a file first
-    with open(EXAMPLE_CSV, "rb") as f:
-        files = {"file": ("auto_test.csv", f, "text/csv")}
-        backend_client.post("/upload_file", files=files)
-    
-    # Query without specifying file_id
+    # The session upload is in place; query without specifying file_id
     query = "Show me 5 cells"
     chat_payload = {
         "messages": [
@@ -198,16 +241,18 @@ if __name__ == "__main__":
     import sys
     
     print("Running integration test...")
-    print(f"Backend URL: {BACKEND_URL}")
+    print(f"Backend URL: {BACKEND_URL or '(in-process)'}")
     print(f"CSV file: {EXAMPLE_CSV}")
     print("")
     
-    client = httpx.Client(base_url=BACKEND_URL, timeout=60.0)
+    client = _make_backend_client()
     
     try:
-        test_upload_and_query_largest_cells_per_cluster(client)
-        print("\n" + "="*60)
-        test_query_without_upload_uses_most_recent(client)
+        test_upload_example_csv(client)
+        file_id = _upload_example_csv(client).json()["file"]["file_id"]
+        test_upload_and_query_largest_cells_per_cluster(client, file_id)
+        print("\n" + _BAR60)
+        test_query_without_upload_uses_most_recent(client, file_id)
         print("\n✅ All tests passed!")
     except AssertionError as e:
         print(f"\n❌ Test failed: {e}")
@@ -1,6 +1,13 @@
 """Test interactive table creation with clickable View buttons."""
+import os
+import re
+
 import panel as pn
 
+_DEBUG = os.getenv("NEUROGLANCER_CHAT_DEBUG", "").lower() in ("1", "true", "yes")
+_TABLE_LINE = re.compile(r"^\s*\|.+\|\s*$", re.M)
+_SEP = re.compile(r"^[\s\-:|]+$")
+
 # Simulate the _create_interactive_table function logic
 def test_interactive_table():
     text = """Results:
@@ -20,33 +27,30 @@ def test_interactive_table():
     # Create URL mapping
     url_map = {view["row_index"]: view["url"] for view in ng_views}
     
-    print("URL Mapping:")
-    for idx, url in url_map.items():
-        print(f"  Row {idx}: {url[:50]}...")
+    if _DEBUG:
+        print("URL Mapping:")
+        for idx, url in url_map.items():
+            print(f"  Row {idx}: {url[:50]}...")
     
     # Parse table
-    lines = [l for l in text.split("\n") if "|" in l]
-    print(f"\nTable lines: {len(lines)}")
+    lines = _TABLE_LINE.findall(text)
+    if _DEBUG:
+        print(f"\nTable lines: {len(lines)}")
     
     # Count data rows (excluding header and separator)
-    data_row_count = 0
-    for i, line in enumerate(lines):
-        if i == 0:  # Header
-            continue
-        parts = [p.strip() for p in line.split("|") if p.strip()]
-        if all(c in "-:|" for p in parts for c in p.replace(" ", "")):
-            continue
-        data_row_count += 1
+    data_row_count = sum(1 for line in lines[1:] if not _SEP.match(line))
     
-    print(f"Data rows: {data_row_count}")
-    print(f"URLs to map: {len(url_map)}")
+    if _DEBUG:
+        print(f"Data rows: {data_row_count}")
+        print(f"URLs to map: {len(url_map)}")
     
     assert data_row_count == len(url_map), "Mismatch between data rows and URLs"
     
-    print("\n✅ Interactive table structure validated!")
-    print(f"   - {data_row_count} View buttons will be created")
-    print(f"   - Each button will call _load_internal_link(url)")
-    print(f"   - Viewer state will update instead of opening new tab")
+    if _DEBUG:
+        print("\n✅ Interactive table structure validated!")
+        print(f"   - {data_row_count} View buttons will be created")
+        print(f"   - Each button will call _load_internal_link(url)")
+        print(f"   - Viewer state will update instead of opening new tab")
 
 if __name__ == "__main__":
     test_interactive_table()
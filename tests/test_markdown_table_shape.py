@@ -0,0 +1,34 @@
+"""Tests for counting rows and columns of markdown result tables."""
+
+import pytest
+
+pytest.importorskip("panel_neuroglancer", reason="panel extras not installed")
+
+from neuroglancer_chat.panel.panel_app import _markdown_table_shape
+
+_WIDE_TABLE = """Query results:
+
+| id | cell_id | x | y | z | mean_intensity | max_intensity | volume | area | perimeter | circularity | eccentricity | cluster | marker | View |
+|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|
+| 1 | 100 | 200 | 10 | 5 | 5.5 | 7.2 | 1000 | 500 | 80 | 0.9 | 0.3 | A | Pvalb | [view](https://ng.app#!v1) |
+| 2 | 110 | 210 | 20 | 6 | 6.5 | 8.1 | 1100 | 520 | 82 | 0.85 | 0.35 | B | Sst | [view](https://ng.app#!v2) |
+| 3 | 120 | 220 | 30 | 7 | 7.5 | 9.0 | 1200 | 540 | 84 | 0.88 | 0.32 | A | Vip | [view](https://ng.app#!v3) |
+
+Total: 3 cells."""
+
+_NARROW_TABLE = """Results:
+
+| id | x | y | z | value | View |
+|---:|---:|---:|---:|---:|---:|
+| 1 | 100 | 200 | 10 | 5.5 | [view](https://ng.app#!v1) |
+| 2 | 110 | 210 | 20 | 6.5 | [view](https://ng.app#!v2) |
+
+Done."""
+
+
+def test_markdown_table_shape():
+    """Rows exclude the header and separator; columns come from the header."""
+    assert _markdown_table_shape(_WIDE_TABLE) == (3, 15)
+    assert _markdown_table_shape(_NARROW_TABLE) == (2, 6)
+    assert _markdown_table_shape("id | x\n---|---\n1 | 2") == (1, 2)
+    assert _markdown_table_shape("no table here") is None
@@ -1,40 +1,59 @@
 """Tests for _mask_client_side: prevents double-wrapping of Neuroglancer URLs."""
 
+import re
+
 import pytest
 
 pytest.importorskip("panel_neuroglancer", reason="panel extras not installed")
 
-from neuroglancer_chat.panel.panel_app import _mask_client_side
+from neuroglancer_chat.panel.panel_app import _NG_URL_RE, _mask_client_side
 
 _BASE = "https://neuroglancer-demo.appspot.com"
 
 
-def test_raw_url_is_masked():
-    """A bare Neuroglancer URL in plain text gets wrapped as a markdown link."""
-    text = f"Check this link: {_BASE}#!{{'layers':[]}}"
-    result = _mask_client_side(text)
-    assert f"[Updated Neuroglancer view]({_BASE}" in result
-
-
-def test_existing_markdown_link_not_re_wrapped():
-    """A URL that is already inside a markdown link is not re-masked."""
-    text = (
-        "Here's your data:\n\n"
-        "| id | value | View |\n"
-        f"| 1 | 5.5 | [view]({_BASE}#!view1) |\n"
-    )
-    result = _mask_client_side(text)
-    assert f"[view]({_BASE}#!view1)" in result
-    assert "Updated Neuroglancer view" not in result
-
-
-def test_mixed_content_masks_only_raw_url():
-    """Raw URLs are masked; already-wrapped markdown links are left alone."""
-    text = (
-        f"Raw URL: {_BASE}#!raw\n"
-        f"Already wrapped: [view]({_BASE}#!wrapped)"
-    )
+@pytest.mark.parametrize(
+    "text, must_contain, must_not_contain, wrapped_count",
+    [
+        # A bare Neuroglancer URL in plain text gets wrapped as a markdown link.
+        (
+            f"Check this link: {_BASE}#!{{'layers':[]}}",
+            [f"[Updated Neuroglancer view]({_BASE}"],
+            [],
+            1,
+        ),
+        # A URL that is already inside a markdown link is not re-masked.
+        (
+            "Here's your data:\n\n"
+            "| id | value | View |\n"
+            f"| 1 | 5.5 | [view]({_BASE}#!view1) |\n",
+            [f"[view]({_BASE}#!view1)"],
+            ["Updated Neuroglancer view"],
+            0,
+        ),
+        # Raw URLs are masked; already-wrapped markdown links are left alone.
+        (
+            f"Raw URL: {_BASE}#!raw\n"
+            f"Already wrapped: [view]({_BASE}#!wrapped)",
+            [f"[Updated Neuroglancer view]({_BASE}#!raw)", f"[view]({_BASE}#!wrapped)"],
+            [],
+            1,
+        ),
+    ],
+    ids=["raw-url", "existing-markdown-link", "mixed-content"],
+)
+def test_mask_client_side(text, must_contain, must_not_contain, wrapped_count):
     result = _mask_client_side(text)
-    assert f"[Updated Neuroglancer view]({_BASE}#!raw)" in result
-    assert f"[view]({_BASE}#!wrapped)" in result
-    assert result.count("Updated Neuroglancer view") == 1
+    for fragment in must_contain:
+        assert fragment in result
+    for fragment in must_not_contain:
+        assert fragment not in result
+    assert result.count("Updated Neuroglancer view") == wrapped_count
+
+
+def test_url_pattern_is_compiled_once():
+    """The masking regex is compiled at import time, not per call."""
+    assert isinstance(_NG_URL_RE, re.Pattern)
+    text = f"a {_BASE}#!x and https://example.com/page"
+    for _ in range(100):
+        result = _mask_client_side(text)
+    assert result == f"a [Updated Neuroglancer view]({_BASE}#!x) and https://example.com/page"
@@ -1,20 +1,39 @@
 """Test automatic Neuroglancer link generation for spatial data."""
 import polars as pl
+import pytest
 from neuroglancer_chat.backend.main import _detect_spatial_columns, _generate_ng_links_for_rows
 from neuroglancer_chat.backend.main import CURRENT_STATE
 
+pytestmark = pytest.mark.xdist_group(name="ng_state")
 
-def test_spatial_detection_xyz():
-    """Test detection of x,y,z spatial columns."""
-    df = pl.DataFrame({
+
+# The frames are independent, so materialize them in a single collect_all pass.
+_XYZ_DF, _CENTROID_DF, _PLAIN_DF = pl.collect_all([
+    pl.LazyFrame({
         'id': [1, 2, 3],
         'x': [100, 200, 300],
         'y': [150, 250, 350],
         'z': [10, 20, 30],
         'value': [1.5, 2.5, 3.5]
-    })
-    
-    result = _detect_spatial_columns(df)
+    }),
+    pl.LazyFrame({
+        'id': [1, 2, 3],
+        'centroid_x': [100, 200, 300],
+        'centroid_y': [150, 250, 350],
+        'centroid_z': [10, 20, 30],
+        'value': [1.5, 2.5, 3.5]
+    }),
+    pl.LazyFrame({
+        'id': [1, 2, 3],
+        'name': ['a', 'b', 'c'],
+        'value': [1.5, 2.5, 3.5]
+    }),
+])
+
+
+def test_spatial_detection_xyz():
+    """Test detection of x,y,z spatial columns."""
+    result = _detect_spatial_columns(_XYZ_DF)
     assert result is not None
     cols, pattern = result
     assert cols == ['x', 'y', 'z']
@@ -23,15 +42,7 @@ def test_spatial_detection_xyz():
 
 def test_spatial_detection_centroid():
     """Test detection of centroid_x,y,z spatial columns."""
-    df = pl.DataFrame({
-        'id': [1, 2, 3],
-        'centroid_x': [100, 200, 300],
-        'centroid_y': [150, 250, 350],
-        'centroid_z': [10, 20, 30],
-        'value': [1.5, 2.5, 3.5]
-    })
-    
-    result = _detect_spatial_columns(df)
+    result = _detect_spatial_columns(_CENTROID_DF)
     assert result is not None
     cols, pattern = result
     assert cols == ['centroid_x', 'centroid_y', 'centroid_z']
@@ -40,13 +51,7 @@ def test_spatial_detection_centroid():
 
 def test_no_spatial_columns():
     """Test non-spatial DataFrame returns None."""
-    df = pl.DataFrame({
-        'id': [1, 2, 3],
-        'name': ['a', 'b', 'c'],
-        'value': [1.5, 2.5, 3.5]
-    })
-    
-    result = _detect_spatial_columns(df)
+    result = _detect_spatial_columns(_PLAIN_DF)
     assert result is None
 
 
@@ -59,15 +64,8 @@ def test_ng_links_raw_urls():
     if CURRENT_STATE is None:
         CURRENT_STATE = NeuroglancerState()
     
-    df = pl.DataFrame({
-        'id': [1, 2, 3],
-        'x': [100, 200, 300],
-        'y': [150, 250, 350],
-        'z': [10, 20, 30]
-    })
-    
     spatial_cols = ['x', 'y', 'z']
-    links = _generate_ng_links_for_rows(df, spatial_cols)
+    links = _generate_ng_links_for_rows(_XYZ_DF, spatial_cols)
     
     assert len(links) == 3
     # Check that URLs are raw (start with https://)
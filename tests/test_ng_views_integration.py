@@ -1,16 +1,16 @@
 """Integration test for Phase 2: ng_views in backend response and frontend rendering."""
+import os
 import re
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app
 
-client = TestClient(app)
+_BAR60 = "=" * 60
+_SPATIAL_CSV = b"id,x,y,z,value\n1,100,200,10,5.5\n2,110,210,20,6.5\n3,120,220,30,7.5\n"
+_DEBUG = os.getenv("NEUROGLANCER_CHAT_DEBUG", "").lower() in ("1", "true", "yes")
 
 
-def test_ng_views_in_chat_response():
+def test_ng_views_in_chat_response(client):
     """Test that ng_views are exposed in /agent/chat response."""
     # Upload a CSV with spatial columns
-    content = b"id,x,y,z,value\n1,100,200,10,5.5\n2,110,210,20,6.5\n3,120,220,30,7.5\n"
-    resp = client.post("/upload_file", files={"file": ("test.csv", content, "text/csv")})
+    resp = client.post("/upload_file", files={"file": ("test.csv", _SPATIAL_CSV, "text/csv")})
     assert resp.status_code == 200
     fid = resp.json()["file"]["file_id"]
     
@@ -41,9 +41,10 @@ def test_ng_views_in_chat_response():
             # Ensure URL is raw (not wrapped in markdown)
             assert not view["url"].startswith("[view]")
         
-        print(f"✓ ng_views structure correct: {len(ng_views)} views")
-        print(f"  Sample view: row_index={ng_views[0]['row_index']}, url starts with {ng_views[0]['url'][:50]}...")
-    else:
+        if _DEBUG:
+            print(f"✓ ng_views structure correct: {len(ng_views)} views")
+            print(f"  Sample view: row_index={ng_views[0]['row_index']}, url starts with {ng_views[0]['url'][:50]}...")
+    elif _DEBUG:
         print("⚠ ng_views was None or empty (may be expected if no spatial columns)")
     
     # Check assistant message is present
@@ -52,7 +53,8 @@ def test_ng_views_in_chat_response():
     message = data["choices"][0]["message"]
     assert "content" in message
     
-    print("✓ Chat response structure valid")
+    if _DEBUG:
+        print("✓ Chat response structure valid")
 
 
 def test_frontend_table_enhancement():
@@ -91,23 +93,28 @@ Analysis complete."""
     for url in view_links:
         assert url in enhanced, f"Expected URL {url} in enhanced text"
     
-    print("✓ Table enhancement adds View column correctly")
-    print(f"  Enhanced table preview:")
-    for line in enhanced.split("\n")[:10]:
-        print(f"    {line}")
+    if _DEBUG:
+        print("✓ Table enhancement adds View column correctly")
+        print(f"  Enhanced table preview:")
+        for line in enhanced.split("\n")[:10]:
+            print(f"    {line}")
 
 
 if __name__ == "__main__":
-    print("=" * 60)
+    print(_BAR60)
     print("Phase 2 Integration Test: ng_views in Chat Response")
-    print("=" * 60)
+    print(_BAR60)
     
+    from fastapi.testclient import TestClient
+    from neuroglancer_chat.backend.main import app
+
     print("\n1. Testing backend ng_views exposure...")
-    test_ng_views_in_chat_response()
+    with TestClient(app) as client:
+        test_ng_views_in_chat_response(client)
     
     print("\n2. Testing frontend table enhancement...")
     test_frontend_table_enhancement()
     
-    print("\n" + "=" * 60)
+    print("\n" + _BAR60)
     print("✅ Phase 2 Integration Tests Passed!")
-    print("=" * 60)
+    print(_BAR60)
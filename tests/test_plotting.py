@@ -6,16 +6,32 @@ import polars as pl
 from neuroglancer_chat.backend.tools.plotting import validate_plot_requirements, build_plot_spec
 
 
-def test_validate_plot_requirements_valid():
-    """Test validation passes for valid plot parameters."""
-    df = pl.DataFrame({
+# The plotting helpers only read their input, so frames are shared across tests.
+@pytest.fixture(scope="module")
+def small_df():
+    return pl.DataFrame({
         "x": [1, 2, 3, 4, 5],
-        "y": [2, 4, 6, 8, 10],
-        "category": ["A", "B", "A", "B", "A"]
+        "y": [2, 4, 6, 8, 10]
     })
-    
+
+
+@pytest.fixture(scope="module")
+def small_df_with_cat(small_df):
+    return small_df.with_columns(category=pl.Series(["A", "B", "A", "B", "A"]))
+
+
+@pytest.fixture(scope="session")
+def large_df():
+    return pl.DataFrame({
+        "x": pl.int_range(0, 15000, eager=True),
+        "y": pl.int_range(0, 15000, eager=True)
+    })
+
+
+def test_validate_plot_requirements_valid(small_df_with_cat):
+    """Test validation passes for valid plot parameters."""
     params = {"x": "x", "y": "y", "by": "category"}
-    result = validate_plot_requirements(df, "scatter", params)
+    result = validate_plot_requirements(small_df_with_cat, "scatter", params)
     
     assert result["valid"] is True
     assert len(result["issues"]) == 0
@@ -47,29 +63,19 @@ def test_validate_plot_requirements_empty_dataframe():
     assert any("empty" in str(issue).lower() for issue in result["issues"])
 
 
-def test_validate_plot_requirements_large_dataframe():
+def test_validate_plot_requirements_large_dataframe(large_df):
     """Test validation suggests optimization for large dataframes."""
-    df = pl.DataFrame({
-        "x": list(range(15000)),
-        "y": list(range(15000))
-    })
-    
     params = {"x": "x", "y": "y"}
-    result = validate_plot_requirements(df, "scatter", params)
+    result = validate_plot_requirements(large_df, "scatter", params)
     
     # Should still be valid but suggest filtering
     assert result["valid"] is True
     assert len(result["suggestions"]) > 0
 
 
-def test_build_plot_spec_structure():
+def test_build_plot_spec_structure(small_df):
     """build_plot_spec returns the expected keys for a scatter plot."""
-    df = pl.DataFrame({
-        "x": [1, 2, 3, 4, 5],
-        "y": [2, 4, 6, 8, 10]
-    })
-
-    result = build_plot_spec(df, "scatter", "x", "y")
+    result = build_plot_spec(small_df, "scatter", "x", "y")
 
     assert isinstance(result, dict)
     # Returns plot_kwargs dict OR an error (if hvplot not installed)
@@ -81,15 +87,9 @@ def test_build_plot_spec_structure():
         assert "is_interactive" in result
 
 
-def test_build_plot_spec_with_grouping():
+def test_build_plot_spec_with_grouping(small_df_with_cat):
     """build_plot_spec handles the by= grouping parameter."""
-    df = pl.DataFrame({
-        "x": [1, 2, 3, 4, 5],
-        "y": [2, 4, 6, 8, 10],
-        "category": ["A", "B", "A", "B", "A"]
-    })
-
-    result = build_plot_spec(df, "scatter", "x", "y", by="category")
+    result = build_plot_spec(small_df_with_cat, "scatter", "x", "y", by="category")
 
     if "plot_kwargs" in result:
         assert result["plot_type"] == "scatter"
@@ -99,33 +99,28 @@ def test_build_plot_spec_with_grouping():
 def test_build_plot_spec_interactive_threshold():
     """Plots are interactive for small datasets and static for large ones."""
     small_df = pl.DataFrame({
-        "x": list(range(50)),
-        "y": list(range(50))
+        "x": pl.int_range(0, 50, eager=True),
+        "y": pl.int_range(0, 50, eager=True)
     })
     small_result = build_plot_spec(small_df, "line", "x", "y")
     if "is_interactive" in small_result:
         assert small_result["is_interactive"] is True
 
     large_df = pl.DataFrame({
-        "x": list(range(250)),
-        "y": list(range(250))
+        "x": pl.int_range(0, 250, eager=True),
+        "y": pl.int_range(0, 250, eager=True)
     })
     large_result = build_plot_spec(large_df, "line", "x", "y")
     if "is_interactive" in large_result:
         assert large_result["is_interactive"] is False
 
 
-def test_build_plot_spec_plot_types():
+@pytest.mark.parametrize("plot_type", ["scatter", "line", "bar"])
+def test_build_plot_spec_plot_types(small_df, plot_type):
     """build_plot_spec accepts all supported plot types."""
-    df = pl.DataFrame({
-        "x": [1, 2, 3, 4, 5],
-        "y": [2, 4, 6, 8, 10]
-    })
-
-    for plot_type in ("scatter", "line", "bar"):
-        result = build_plot_spec(df, plot_type, "x", "y")
-        assert isinstance(result, dict)
-        if "plot_kwargs" in result:
-            assert result["plot_type"] == plot_type
-        elif "error" in result:
-            assert "hvplot" in result["error"].lower()
+    result = build_plot_spec(small_df, plot_type, "x", "y")
+    assert isinstance(result, dict)
+    if "plot_kwargs" in result:
+        assert result["plot_type"] == plot_type
+    elif "error" in result:
+        assert "hvplot" in result["error"].lower()
@@ -2,11 +2,15 @@
 Tests for Neuroglancer JSON pointer expansion functionality.
 """
 
+import functools
+import io
 import json
 import pytest
+from types import MappingProxyType, SimpleNamespace
 from unittest.mock import Mock, patch
 from typing import Dict, Any
 
+from neuroglancer_chat.backend.tools import pointer_expansion as _pe
 from neuroglancer_chat.backend.tools.pointer_expansion import (
     expand_if_pointer_and_generate_inline,
     is_pointer_url,
@@ -22,63 +26,138 @@ from neuroglancer_chat.backend.tools.pointer_expansion import (
 )
 
 
+@pytest.fixture(scope="module")
+def make_fetcher():
+    """Build a fetcher returning a pre-serialized payload, optionally checking the URL prefix."""
+    def _make(payload: str, expect_prefix: str = ""):
+        def fetcher(url: str) -> str:
+            assert url.startswith(expect_prefix)
+            return payload
+        return fetcher
+    return _make
+
+
+# Example states and their compact JSON (the form the canonical URL embeds), encoded once
+_HEMIBRAIN_STATE = {
+    "dimensions": {"x": [8e-9, "m"], "y": [8e-9, "m"], "z": [8e-9, "m"]},
+    "position": [16000, 16000, 16000],
+    "crossSectionScale": 1,
+    "layers": [
+        {
+            "type": "image",
+            "source": "precomputed://gs://neuroglancer-janelia-flyem-hemibrain/v1.0/em",
+            "name": "em"
+        }
+    ]
+}
+_HEMIBRAIN_JSON = json.dumps(_HEMIBRAIN_STATE, separators=(",", ":"))
+
+_AIND_STATE = {
+    "dimensions": {"x": [2.45e-7, "m"], "y": [2.45e-7, "m"], "z": [1e-6, "m"]},
+    "position": [48.5, -5423.5, 584.5],
+    "layers": [
+        {
+            "type": "image",
+            "source": "zarr://s3://aind-open-data/HCR_754803-03_2025-04-04_13-00-00/SPIM.ome.zarr",
+            "name": "raw_data"
+        }
+    ]
+}
+_AIND_JSON = json.dumps(_AIND_STATE, separators=(",", ":"))
+
+_SIMPLE_STATE = {"test": "value"}
+_SIMPLE_STATE_JSON = json.dumps(_SIMPLE_STATE, separators=(",", ":"))
+
+# Read-only so tests sharing it cannot mutate it between runs
+_ROUNDTRIP_STATE = MappingProxyType({
+    "dimensions": {"x": [1e-9, "m"], "y": [1e-9, "m"], "z": [1e-9, "m"]},
+    "position": [100, 200, 300],
+    "layers": [{"type": "image", "source": "test://data", "name": "test"}]
+})
+_ROUNDTRIP_JSON = json.dumps(dict(_ROUNDTRIP_STATE), separators=(",", ":"))
+
+
+def _return_payload(payload: str, url: str) -> str:
+    return payload
+
+
 class TestPointerDetection:
     """Test pointer URL detection functionality."""
     
-    def test_is_pointer_url_with_s3_pointer(self):
-        """Test detection of s3:// pointers."""
-        url = "https://example.com/#!s3://bucket/file.json"
-        assert is_pointer_url(url) is True
-    
-    def test_is_pointer_url_with_gs_pointer(self):
-        """Test detection of gs:// pointers."""
-        url = "https://example.com/#!gs://bucket/file.json"
-        assert is_pointer_url(url) is True
-    
-    def test_is_pointer_url_with_http_pointer(self):
-        """Test detection of http:// pointers."""
-        url = "https://example.com/#!https://other.com/file.json"
-        assert is_pointer_url(url) is True
-    
-    def test_is_pointer_url_with_inline_json(self):
-        """Test detection of inline JSON (not a pointer)."""
-        url = "https://example.com/#!%7B%22test%22%3A%22value%22%7D"
-        assert is_pointer_url(url) is False
-    
-    def test_is_pointer_url_without_fragment(self):
-        """Test URL without fragment."""
-        url = "https://example.com/"
-        assert is_pointer_url(url) is False
-    
-    def test_is_pointer_url_with_just_pointer(self):
-        """Test just pointer without base URL."""
-        url = "s3://bucket/file.json"
-        assert is_pointer_url(url) is False  # No #! fragment
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            ("https://example.com/#!s3://bucket/file.json", True),
+            ("https://example.com/#!gs://bucket/file.json", True),
+            ("https://example.com/#!https://other.com/file.json", True),
+            ("https://example.com/#!%7B%22test%22%3A%22value%22%7D", False),
+            ("https://example.com/", False),
+            ("s3://bucket/file.json", False),  # No #! fragment
+        ],
+        ids=["s3", "gs", "http", "inline-json", "no-fragment", "bare-pointer"],
+    )
+    def test_is_pointer_url(self, url, expected):
+        """Pointers (s3://, gs://, http(s)://) after #! are detected; inline JSON is not."""
+        assert is_pointer_url(url) is expected
+    
+    @pytest.mark.parametrize("fragment", ["%7B%22a%22%3A1%7D", "%7b%22a%22%3A1%7d", '{"a":1}'])
+    def test_is_pointer_url_fast_reject_inline(self, fragment, monkeypatch):
+        """Inline JSON fragments are rejected before any percent-decoding."""
+        def _no_decode(_):
+            raise AssertionError("fragment should not be decoded")
+        monkeypatch.setattr(_pe, "_percent_decode", _no_decode)
+        assert is_pointer_url("https://example.com/#!" + fragment) is False
 
 
 class TestJsonDetection:
     """Test JSON detection helper."""
     
-    def test_is_probably_json_valid(self):
-        """Test valid JSON detection."""
-        assert _is_probably_json('{"test": "value"}') is True
-        assert _is_probably_json('  {"nested": {"key": "val"}}  ') is True
-    
-    def test_is_probably_json_invalid(self):
-        """Test non-JSON detection."""
-        assert _is_probably_json('s3://bucket/file.json') is False
-        assert _is_probably_json('{"incomplete": ') is False
-        assert _is_probably_json('') is False
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            ('{"test": "value"}', True),
+            ('  {"nested": {"key": "val"}}  ', True),
+            ('s3://bucket/file.json', False),
+            ('{"incomplete": ', False),
+            ('', False),
+        ],
+    )
+    def test_is_probably_json(self, text, expected):
+        """Test JSON vs non-JSON detection."""
+        assert _is_probably_json(text) is expected
 
 
 class TestUrlEncoding:
     """Test URL encoding/decoding utilities."""
     
-    def test_percent_decode(self):
+    @pytest.mark.parametrize(
+        "encoded, decoded",
+        [
+            ("%7B%22test%22%3A%22value%22%7D", '{"test":"value"}'),
+            ("s3%3A%2F%2Fbucket%2Ffile.json", "s3://bucket/file.json"),
+        ],
+    )
+    def test_percent_decode(self, encoded, decoded):
         """Test percent decoding."""
-        encoded = "%7B%22test%22%3A%22value%22%7D"
-        decoded = _percent_decode(encoded)
-        assert decoded == '{"test":"value"}'
+        assert _percent_decode(encoded) == decoded
+    
+    @pytest.mark.parametrize(
+        "obj",
+        [
+            {},
+            {"a": 1},
+            {"name": "layer with spaces", "n": -3},
+            {"reserved": "#!?&=/%:+,;@[]", "quote": "it's \"quoted\""},
+            {"unicode": "µm – 細胞 🧠", "": 0},
+            {"nested": {"list": [1, 2.5, None, True], "path": "s3://b/k.json"}},
+        ],
+        ids=["empty", "simple", "spaces", "reserved", "unicode", "nested"],
+    )
+    def test_percent_roundtrip(self, obj):
+        """Encoding then decoding gives back the same object for awkward keys and values."""
+        encoded = _percent_encode_minified(obj)
+        assert json.loads(_percent_decode(encoded)) == obj
+        assert is_pointer_url("https://example.com/#!" + encoded) is False
     
     def test_percent_encode_minified(self):
         """Test percent encoding with minification."""
@@ -106,27 +185,22 @@ class TestResolvePointer:
         assert state == {"test": "value"}
         assert was_pointer is False
     
-    def test_resolve_pointer_with_mock_fetcher(self):
+    def test_resolve_pointer_with_mock_fetcher(self, make_fetcher):
         """Test resolving pointer with mock fetcher."""
         mock_json = '{"dimensions": {"x": [1e-9, "m"]}, "position": [0, 0, 0]}'
         
-        def mock_fetcher(url: str) -> str:
-            assert url == "s3://bucket/state.json"
-            return mock_json
-        
         fragment = "s3://bucket/state.json"
-        state, was_pointer = resolve_neuroglancer_pointer(fragment, fetcher=mock_fetcher)
+        state, was_pointer = resolve_neuroglancer_pointer(
+            fragment, fetcher=make_fetcher(mock_json, "s3://bucket/state.json")
+        )
         assert state == {"dimensions": {"x": [1e-9, "m"]}, "position": [0, 0, 0]}
         assert was_pointer is True
     
-    def test_resolve_pointer_invalid_json(self):
+    def test_resolve_pointer_invalid_json(self, make_fetcher):
         """Test error handling for invalid JSON."""
-        def bad_fetcher(url: str) -> str:
-            return "not json"
-        
         fragment = "s3://bucket/bad.json"
         with pytest.raises(ValueError, match="not valid JSON"):
-            resolve_neuroglancer_pointer(fragment, fetcher=bad_fetcher)
+            resolve_neuroglancer_pointer(fragment, fetcher=make_fetcher("not json"))
     
     def test_resolve_pointer_fetch_error(self):
         """Test error handling for fetch failures."""
@@ -191,17 +265,14 @@ class TestExpandPointer:
         # Should generate canonical URL
         assert canonical.startswith("https://neuroglancer.example.com/#!")
     
-    def test_expand_pointer_url(self):
+    def test_expand_pointer_url(self, make_fetcher):
         """Test expansion of URL with pointer."""
         pointer_url = "https://neuroglancer.example.com/#!s3://bucket/state.json"
         mock_state = {"dimensions": {"x": [1e-9, "m"]}, "position": [100, 200, 300]}
-        
-        def mock_fetcher(url: str) -> str:
-            assert url == "s3://bucket/state.json"
-            return json.dumps(mock_state)
+        fetcher = make_fetcher(json.dumps(mock_state), "s3://bucket/state.json")
         
         canonical, state, was_pointer = expand_if_pointer_and_generate_inline(
-            pointer_url, fetcher=mock_fetcher
+            pointer_url, fetcher=fetcher
         )
         assert state == mock_state
         assert was_pointer is True
@@ -209,61 +280,69 @@ class TestExpandPointer:
         # Should contain encoded state
         assert "dimensions" in canonical
     
-    def test_expand_fragment_only(self):
+    def test_expand_fragment_only(self, make_fetcher):
         """Test expansion of fragment-only input."""
         fragment = "s3://bucket/state.json"
-        mock_state = {"test": "value"}
-        
-        def mock_fetcher(url: str) -> str:
-            return json.dumps(mock_state)
         
         canonical, state, was_pointer = expand_if_pointer_and_generate_inline(
-            fragment, fetcher=mock_fetcher
+            fragment, fetcher=make_fetcher(_SIMPLE_STATE_JSON)
         )
-        assert state == mock_state
+        assert state == _SIMPLE_STATE
         assert was_pointer is True
         # Should use default base URL
         assert canonical.startswith("https://neuroglancer-demo.appspot.com/#!")
     
-    def test_expand_with_custom_base(self):
+    def test_expand_with_custom_base(self, make_fetcher):
         """Test expansion preserves custom base URL."""
         pointer_url = "https://custom.neuroglancer.com/#!gs://bucket/state.json"
-        mock_state = {"test": "value"}
-        
-        def mock_fetcher(url: str) -> str:
-            return json.dumps(mock_state)
         
         canonical, state, was_pointer = expand_if_pointer_and_generate_inline(
-            pointer_url, fetcher=mock_fetcher
+            pointer_url, fetcher=make_fetcher(_SIMPLE_STATE_JSON)
         )
         assert canonical.startswith("https://custom.neuroglancer.com/#!")
 
 
+class _FakeS3:
+    """Minimal boto3 S3 client: get_object returns a readable body."""
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+        self.calls = []
+
+    def get_object(self, Bucket, Key):
+        self.calls.append((Bucket, Key))
+        return {'Body': io.BytesIO(self.payload)}
+
+
+class _FakeGcsClient:
+    """Minimal google-cloud-storage client: bucket(...).blob(...).download_as_text()."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = []
+
+    def bucket(self, bucket_name):
+        return SimpleNamespace(blob=lambda blob_name: self._blob(bucket_name, blob_name))
+
+    def _blob(self, bucket_name, blob_name):
+        self.calls.append((bucket_name, blob_name))
+        return SimpleNamespace(download_as_text=lambda: self.text)
+
+
 class TestFetchers:
     """Test cloud storage fetchers."""
     
-    @patch('neuroglancer_chat.backend.tools.pointer_expansion._HAS_BOTO3', True)
-    @patch('neuroglancer_chat.backend.tools.pointer_expansion.boto3')
-    def test_fetch_s3_success(self, mock_boto3):
+    def test_fetch_s3_success(self):
         """Test successful S3 fetch."""
-        mock_s3_client = Mock()
-        mock_boto3.client.return_value = mock_s3_client
-        
-        mock_body = Mock()
-        mock_body.read.return_value.decode.return_value = '{"test": "value"}'
-        mock_response = {'Body': mock_body}
-        mock_s3_client.get_object.return_value = mock_response
+        fake_s3 = _FakeS3(b'{"test": "value"}')
         
-        result = _fetch_s3("s3://test-bucket/path/to/file.json")
+        result = _fetch_s3("s3://test-bucket/path/to/file.json", client_factory=lambda: fake_s3)
         assert result == '{"test": "value"}'
-        
-        mock_s3_client.get_object.assert_called_once_with(
-            Bucket="test-bucket", Key="path/to/file.json"
-        )
+        assert fake_s3.calls == [("test-bucket", "path/to/file.json")]
     
-    @patch('neuroglancer_chat.backend.tools.pointer_expansion._HAS_BOTO3', False)
-    def test_fetch_s3_missing_boto3(self):
+    def test_fetch_s3_missing_boto3(self, monkeypatch):
         """Test S3 fetch without boto3 installed."""
+        monkeypatch.setattr(_pe, "_HAS_BOTO3", False)
         with pytest.raises(RuntimeError, match="boto3 not installed"):
             _fetch_s3("s3://bucket/file.json")
     
@@ -272,28 +351,17 @@ class TestFetchers:
         with pytest.raises(ValueError, match="Not a valid s3 URL"):
             _fetch_s3("invalid://url")
     
-    @patch('neuroglancer_chat.backend.tools.pointer_expansion._HAS_GCS', True)
-    @patch('neuroglancer_chat.backend.tools.pointer_expansion.gcs')
-    def test_fetch_gs_success(self, mock_gcs):
+    def test_fetch_gs_success(self):
         """Test successful GS fetch."""
-        mock_client = Mock()
-        mock_gcs.Client.return_value = mock_client
-        
-        mock_bucket = Mock()
-        mock_blob = Mock()
-        mock_blob.download_as_text.return_value = '{"test": "gs_value"}'
-        mock_bucket.blob.return_value = mock_blob
-        mock_client.bucket.return_value = mock_bucket
+        fake_client = _FakeGcsClient('{"test": "gs_value"}')
         
-        result = _fetch_gs("gs://test-bucket/path/to/file.json")
+        result = _fetch_gs("gs://test-bucket/path/to/file.json", client_factory=lambda: fake_client)
         assert result == '{"test": "gs_value"}'
-        
-        mock_client.bucket.assert_called_once_with("test-bucket")
-        mock_bucket.blob.assert_called_once_with("path/to/file.json")
+        assert fake_client.calls == [("test-bucket", "path/to/file.json")]
     
-    @patch('neuroglancer_chat.backend.tools.pointer_expansion._HAS_GCS', False)
-    def test_fetch_gs_missing_gcs(self):
+    def test_fetch_gs_missing_gcs(self, monkeypatch):
         """Test GS fetch without google-cloud-storage installed."""
+        monkeypatch.setattr(_pe, "_HAS_GCS", False)
         with pytest.raises(RuntimeError, match="google-cloud-storage not installed"):
             _fetch_gs("gs://bucket/file.json")
     
@@ -322,80 +390,41 @@ class TestFetchers:
 class TestIntegrationScenarios:
     """Test realistic integration scenarios."""
     
-    def test_hemibrain_gs_example(self):
+    def test_hemibrain_gs_example(self, make_fetcher):
         """Test with realistic hemibrain GS URL."""
         url = "https://hemibrain-dot-neuroglancer-demo.appspot.com/#!gs://neuroglancer-janelia-flyem-hemibrain/v1.0/neuroglancer_demo_states/base.json"
-        
-        # Mock realistic neuroglancer state
-        mock_state = {
-            "dimensions": {"x": [8e-9, "m"], "y": [8e-9, "m"], "z": [8e-9, "m"]},
-            "position": [16000, 16000, 16000],
-            "crossSectionScale": 1,
-            "layers": [
-                {
-                    "type": "image",
-                    "source": "precomputed://gs://neuroglancer-janelia-flyem-hemibrain/v1.0/em",
-                    "name": "em"
-                }
-            ]
-        }
-        
-        def mock_fetcher(url: str) -> str:
-            assert url.startswith("gs://neuroglancer-janelia-flyem-hemibrain")
-            return json.dumps(mock_state)
+        fetcher = make_fetcher(_HEMIBRAIN_JSON, "gs://neuroglancer-janelia-flyem-hemibrain")
         
         canonical, state, was_pointer = expand_if_pointer_and_generate_inline(
-            url, fetcher=mock_fetcher
+            url, fetcher=fetcher
         )
         
         assert was_pointer is True
-        assert state == mock_state
+        assert state == _HEMIBRAIN_STATE
         assert canonical.startswith("https://hemibrain-dot-neuroglancer-demo.appspot.com/#!")
+        assert _percent_decode(canonical.split("#!", 1)[1]) == _HEMIBRAIN_JSON
         assert len(canonical) > len(url)  # Should be longer due to inline JSON
     
-    def test_aind_s3_example(self):
+    def test_aind_s3_example(self, make_fetcher):
         """Test with realistic AIND S3 URL."""
         url = "https://aind-neuroglancer-sauujisjxq-uw.a.run.app/#!s3://aind-open-data/HCR_754803-03_2025-04-04_13-00-00/raw_data.json"
-        
-        mock_state = {
-            "dimensions": {"x": [2.45e-7, "m"], "y": [2.45e-7, "m"], "z": [1e-6, "m"]},
-            "position": [48.5, -5423.5, 584.5],
-            "layers": [
-                {
-                    "type": "image",
-                    "source": "zarr://s3://aind-open-data/HCR_754803-03_2025-04-04_13-00-00/SPIM.ome.zarr",
-                    "name": "raw_data"
-                }
-            ]
-        }
-        
-        def mock_fetcher(url: str) -> str:
-            assert url.startswith("s3://aind-open-data")
-            return json.dumps(mock_state)
+        fetcher = make_fetcher(_AIND_JSON, "s3://aind-open-data")
         
         canonical, state, was_pointer = expand_if_pointer_and_generate_inline(
-            url, fetcher=mock_fetcher
+            url, fetcher=fetcher
         )
         
         assert was_pointer is True
-        assert state == mock_state
+        assert state == _AIND_STATE
         assert canonical.startswith("https://aind-neuroglancer-sauujisjxq-uw.a.run.app/#!")
+        assert _percent_decode(canonical.split("#!", 1)[1]) == _AIND_JSON
     
     def test_roundtrip_consistency(self):
         """Test that expand -> serialize -> expand is consistent."""
-        original_state = {
-            "dimensions": {"x": [1e-9, "m"], "y": [1e-9, "m"], "z": [1e-9, "m"]},
-            "position": [100, 200, 300],
-            "layers": [{"type": "image", "source": "test://data", "name": "test"}]
-        }
-        
-        def mock_fetcher(url: str) -> str:
-            return json.dumps(original_state)
-        
         # First expansion
         pointer_url = "https://example.com/#!s3://bucket/state.json"
         canonical1, state1, was_pointer1 = expand_if_pointer_and_generate_inline(
-            pointer_url, fetcher=mock_fetcher
+            pointer_url, fetcher=functools.partial(_return_payload, _ROUNDTRIP_JSON)
         )
         
         # Second expansion on canonical URL (should be no-op)
@@ -403,5 +432,5 @@ class TestIntegrationScenarios:
         
         assert was_pointer1 is True
         assert was_pointer2 is False
-        assert state1 == state2 == original_state
+        assert state1 == state2 == _ROUNDTRIP_STATE
         # URLs might not be identical due to key ordering, but states should match
\ No newline at end of file
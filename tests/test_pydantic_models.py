@@ -7,20 +7,38 @@ Verifies that all endpoints using Pydantic models work correctly via:
 """
 
 import pytest
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app, CURRENT_STATE, DATA_MEMORY, _execute_tool_by_name
+from urllib.parse import unquote_to_bytes
+from neuroglancer_chat.backend.main import CURRENT_STATE, DATA_MEMORY, _execute_tool_by_name
 from neuroglancer_chat.backend.tools.neuroglancer_state import NeuroglancerState
 
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    import json as _json
 
-@pytest.fixture
-def client():
-    """FastAPI test client."""
-    return TestClient(app)
+
+def _decode_state_url(url: str) -> dict:
+    """Decode the JSON state embedded in a ``#!`` Neuroglancer URL."""
+    fragment = url.split("#!", 1)[1]
+    return _json.loads(unquote_to_bytes(fragment))
+
+
+@pytest.fixture(params=["http", "dispatcher"])
+def invoke(request, client):
+    """Call a tool by name over HTTP (expecting 200) or through ``_execute_tool_by_name``."""
+    if request.param == "dispatcher":
+        return _execute_tool_by_name
+
+    def _via_http(tool: str, body: dict) -> dict:
+        response = client.post(f"/tools/{tool}", json=body)
+        assert response.status_code == 200
+        return response.json()
+    return _via_http
 
 
 @pytest.fixture(autouse=True)
-def reset_state():
-    """Reset global state before each test."""
+def reset_ng_state():
+    """Reset the global Neuroglancer state before each test."""
     global CURRENT_STATE
     from neuroglancer_chat.backend.main import CURRENT_STATE as _cs
     # Reset to fresh state
@@ -32,30 +50,26 @@ def reset_state():
         "layers": [],
         "layout": "xy",
     }
+
+
+@pytest.fixture
+def reset_data_memory():
+    """Drop summaries and plots created by a data-tool test.
+
+    Files are kept so the session-scoped upload survives.
+    """
     yield
-    # Cleanup after test
-    DATA_MEMORY.files.clear()
     DATA_MEMORY.summaries.clear()
     DATA_MEMORY.plots.clear()
 
 
+@pytest.mark.xdist_group(name="ng_state")
 class TestAddLayer:
     """Tests for ng_add_layer endpoint (critical bug fix)."""
     
-    def test_add_layer_via_http(self, client):
-        """Test adding layer via HTTP request."""
-        response = client.post(
-            "/tools/ng_add_layer",
-            json={"name": "test_layer", "layer_type": "image", "visible": True}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["ok"] is True
-        assert data["layer"] == "test_layer"
-        
-    def test_add_layer_via_dispatcher(self):
-        """Test adding layer via internal dispatcher."""
-        result = _execute_tool_by_name(
+    def test_add_layer(self, invoke):
+        """Test adding layer via HTTP request and the internal dispatcher."""
+        result = invoke(
             "ng_add_layer",
             {"name": "test_layer", "layer_type": "image", "visible": True}
         )
@@ -73,8 +87,7 @@ class TestAddLayer:
         
         # Verify layer was added correctly
         from neuroglancer_chat.backend.main import CURRENT_STATE
-        layers = CURRENT_STATE.data.get("layers", [])
-        ann_layer = next((l for l in layers if l["name"] == "ann"), None)
+        ann_layer = CURRENT_STATE.get_layer("ann")
         assert ann_layer is not None
         assert ann_layer["type"] == "annotation"
         # Source should be a string or dict, never a Body object
@@ -104,6 +117,7 @@ class TestAddLayer:
         assert response.status_code == 422  # Pydantic validation error
 
 
+@pytest.mark.xdist_group(name="ng_state")
 class TestAnnotationWorkflow:
     """Test the complete annotation workflow that was failing."""
     
@@ -119,8 +133,7 @@ class TestAnnotationWorkflow:
         assert result1["ok"] is True
         
         # Verify layer was created in state with correct schema
-        layers = CURRENT_STATE.data.get("layers", [])
-        ann_layer = next((l for l in layers if l["name"] == "ann"), None)
+        ann_layer = CURRENT_STATE.get_layer("ann")
         assert ann_layer is not None, "Annotation layer was not added to state"
         assert ann_layer["type"] == "annotation"
         assert isinstance(ann_layer["source"], dict), "Annotation layer source should be dict"
@@ -144,8 +157,7 @@ class TestAnnotationWorkflow:
         assert result2["ok"] is True
         
         # Step 3: Verify annotation was actually added to state dict (at layer level, not in source)
-        layers = CURRENT_STATE.data.get("layers", [])
-        ann_layer = next((l for l in layers if l["name"] == "ann"), None)
+        ann_layer = CURRENT_STATE.get_layer("ann")
         assert ann_layer is not None, "Annotation layer disappeared from state"
         annotations = ann_layer["annotations"]  # At layer level now
         assert len(annotations) == initial_count + 1, f"Annotation not added. Expected {initial_count + 1}, got {len(annotations)}"
@@ -166,13 +178,7 @@ class TestAnnotationWorkflow:
             pytest.fail(f"Failed to serialize state to URL: {e}")
         
         # Step 5: Verify the annotation persists in serialized state
-        import json
-        from urllib.parse import unquote
-        fragment = url.split("#!")[1]
-        decoded = unquote(fragment)
-        state_dict = json.loads(decoded)
-        serialized_layers = state_dict.get("layers", [])
-        serialized_ann = next((l for l in serialized_layers if l["name"] == "ann"), None)
+        serialized_ann = NeuroglancerState(_decode_state_url(url)).get_layer("ann")
         assert serialized_ann is not None, "Annotation layer not in serialized state"
         serialized_annotations = serialized_ann["annotations"]  # At layer level now
         assert len(serialized_annotations) == 1, f"Annotation not in serialized state: {serialized_annotations}"
@@ -187,14 +193,11 @@ class TestAnnotationWorkflow:
         
         # Get layer and check source type
         from neuroglancer_chat.backend.main import CURRENT_STATE
-        layers = CURRENT_STATE.data.get("layers", [])
-        ann_layer = next((l for l in layers if l["name"] == "ann"), None)
+        ann_layer = CURRENT_STATE.get_layer("ann")
         
-        # Source should never be a Body object
-        source = ann_layer["source"]
-        assert not hasattr(source, 'embed')  # Body objects have 'embed' attribute
-        assert not str(type(source).__name__).endswith('Body')
-        assert isinstance(source, (str, dict))
+        # Source must be a plain str or dict, never a Body object (or subclass)
+        t = type(ann_layer["source"])
+        assert t is str or t is dict
     
     def test_annotation_persistence_via_http(self, client):
         """Test that annotations persist in CURRENT_STATE when added via HTTP endpoint."""
@@ -208,8 +211,7 @@ class TestAnnotationWorkflow:
         assert response1.status_code == 200
         
         # Step 2: Verify layer exists in global CURRENT_STATE with correct schema
-        layers = CURRENT_STATE.data.get("layers", [])
-        ann_layer = next((l for l in layers if l["name"] == "persist_test"), None)
+        ann_layer = CURRENT_STATE.get_layer("persist_test")
         assert ann_layer is not None, "Layer not found in CURRENT_STATE after HTTP creation"
         assert ann_layer["source"].get("url") == "local://annotations", "Source should use local://annotations URL"
         initial_count = len(ann_layer["annotations"])  # At layer level now
@@ -229,8 +231,7 @@ class TestAnnotationWorkflow:
         assert response2.json()["ok"] is True
         
         # Step 4: CRITICAL - Verify annotations actually persisted in CURRENT_STATE (at layer level)
-        layers = CURRENT_STATE.data.get("layers", [])
-        ann_layer = next((l for l in layers if l["name"] == "persist_test"), None)
+        ann_layer = CURRENT_STATE.get_layer("persist_test")
         assert ann_layer is not None, "Layer disappeared from CURRENT_STATE after adding annotations"
         current_count = len(ann_layer["annotations"])  # At layer level now
         assert current_count == initial_count + 2, \
@@ -249,78 +250,46 @@ class TestAnnotationWorkflow:
         assert "neuroglancer" in url
         
         # Step 7: Verify annotations persist in serialized form
-        import json
-        from urllib.parse import unquote
-        fragment = url.split("#!")[1]
-        decoded = unquote(fragment)
-        state_dict = json.loads(decoded)
-        serialized_ann = next((l for l in state_dict["layers"] if l["name"] == "persist_test"), None)
+        serialized_ann = NeuroglancerState(_decode_state_url(url)).get_layer("persist_test")
         assert serialized_ann is not None
         assert len(serialized_ann["annotations"]) == current_count  # At layer level now
 
 
+@pytest.mark.xdist_group(name="ng_state")
 class TestSetLayerVisibility:
     """Tests for ng_set_layer_visibility endpoint."""
     
-    def test_set_visibility_via_http(self, client):
-        """Test setting layer visibility via HTTP."""
+    def test_set_visibility(self, invoke):
+        """Test setting layer visibility via HTTP and the dispatcher."""
         # First add a layer
-        client.post("/tools/ng_add_layer", json={"name": "test", "layer_type": "image"})
+        invoke("ng_add_layer", {"name": "test", "layer_type": "image"})
         
         # Then toggle visibility
-        response = client.post(
-            "/tools/ng_set_layer_visibility",
-            json={"name": "test", "visible": False}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["ok"] is True
-        assert data["visible"] is False
-        
-    def test_set_visibility_via_dispatcher(self):
-        """Test setting layer visibility via dispatcher."""
-        # Add layer first
-        _execute_tool_by_name("ng_add_layer", {"name": "test", "layer_type": "image"})
-        
-        # Toggle visibility
-        result = _execute_tool_by_name(
+        result = invoke(
             "ng_set_layer_visibility",
             {"name": "test", "visible": False}
         )
         assert result["ok"] is True
+        assert result["visible"] is False
 
 
+@pytest.mark.xdist_group(name="ng_state")
 class TestStateLoad:
     """Tests for state_load and demo_load endpoints."""
     
-    def test_state_load_via_http(self, client):
-        """Test loading state via HTTP."""
-        # Create a simple state URL
-        from neuroglancer_chat.backend.main import CURRENT_STATE
-        url = CURRENT_STATE.to_url()
-        
-        response = client.post("/tools/state_load", json={"link": url})
-        assert response.status_code == 200
-        assert response.json()["ok"] is True
-        
-    def test_state_load_via_dispatcher(self):
-        """Test loading state via dispatcher."""
-        from neuroglancer_chat.backend.main import CURRENT_STATE
-        url = CURRENT_STATE.to_url()
-        
-        result = _execute_tool_by_name("state_load", {"link": url})
+    def test_state_load(self, invoke, default_state_url):
+        """Test loading state via HTTP and the dispatcher."""
+        result = invoke("state_load", {"link": default_state_url})
         assert result["ok"] is True
         
-    def test_demo_load_same_as_state_load(self, client):
+    def test_demo_load_same_as_state_load(self, client, default_state_url):
         """Verify demo_load uses same StateLoad model."""
-        from neuroglancer_chat.backend.main import CURRENT_STATE
-        url = CURRENT_STATE.to_url()
-        
-        response = client.post("/tools/demo_load", json={"link": url})
+        response = client.post("/tools/demo_load", json={"link": default_state_url})
         assert response.status_code == 200
         assert response.json()["ok"] is True
 
 
+@pytest.mark.xdist_group(name="ng_state")
 class TestStateSummary:
     """Tests for ng_state_summary endpoint."""
     
@@ -346,37 +315,18 @@ class TestStateSummary:
         assert result["detail"] == "minimal"
 
 
+@pytest.mark.usefixtures("reset_data_memory")
 class TestDataTools:
     """Tests for data tool endpoints."""
     
-    @pytest.fixture
-    def uploaded_file(self, client):
-        """Upload a test CSV file."""
-        import io
-        csv_content = b"cell_id,x,y,z,volume\n1,100,200,50,1000\n2,150,250,60,1200\n"
-        files = {"file": ("test.csv", io.BytesIO(csv_content), "text/csv")}
-        response = client.post("/upload_file", files=files)
-        assert response.status_code == 200
-        return response.json()["file"]["file_id"]
-    
-    def test_data_info_via_http(self, client, uploaded_file):
-        """Test data_info via HTTP."""
-        response = client.post(
-            "/tools/data_info",
-            json={"file_id": uploaded_file, "sample_rows": 2}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["file_id"] == uploaded_file
-        assert data["n_rows"] == 2
-        
-    def test_data_info_via_dispatcher(self, uploaded_file):
-        """Test data_info via dispatcher."""
-        result = _execute_tool_by_name(
+    def test_data_info(self, invoke, uploaded_file):
+        """Test data_info via HTTP and the dispatcher."""
+        result = invoke(
             "data_info",
             {"file_id": uploaded_file, "sample_rows": 2}
         )
         assert result["file_id"] == uploaded_file
+        assert result["n_rows"] == 3
         
     def test_data_preview_via_http(self, client, uploaded_file):
         """Test data_preview via HTTP."""
@@ -400,37 +350,13 @@ class TestDataTools:
         assert "rows" in data
 
 
+@pytest.mark.usefixtures("reset_data_memory")
 class TestDataQueryPolars:
     """Tests for data_query_polars endpoint."""
     
-    @pytest.fixture
-    def uploaded_file(self, client):
-        """Upload a test CSV file."""
-        import io
-        csv_content = b"cell_id,x,y,z,volume\n1,100,200,50,1000\n2,150,250,60,1200\n3,200,300,70,800\n"
-        files = {"file": ("test.csv", io.BytesIO(csv_content), "text/csv")}
-        response = client.post("/upload_file", files=files)
-        assert response.status_code == 200
-        return response.json()["file"]["file_id"]
-    
-    def test_query_via_http(self, client, uploaded_file):
-        """Test data query via HTTP."""
-        response = client.post(
-            "/tools/data_query_polars",
-            json={
-                "file_id": uploaded_file,
-                "expression": "df.filter(pl.col('volume') > 900)",
-                "limit": 100
-            }
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["ok"] is True
-        assert data["rows"] == 2  # Two rows with volume > 900
-        
-    def test_query_via_dispatcher(self, uploaded_file):
-        """Test data query via dispatcher."""
-        result = _execute_tool_by_name(
+    def test_query(self, invoke, uploaded_file):
+        """Test data query via HTTP and the dispatcher."""
+        result = invoke(
             "data_query_polars",
             {
                 "file_id": uploaded_file,
@@ -439,41 +365,16 @@ class TestDataQueryPolars:
             }
         )
         assert result["ok"] is True
-        assert result["rows"] == 2
+        assert result["rows"] == 2  # Two rows with volume > 900
 
 
+@pytest.mark.usefixtures("reset_data_memory")
 class TestDataPlot:
     """Tests for data_plot endpoint."""
     
-    @pytest.fixture
-    def uploaded_file(self, client):
-        """Upload a test CSV file."""
-        import io
-        csv_content = b"cell_id,x,y,z,volume\n1,100,200,50,1000\n2,150,250,60,1200\n3,200,300,70,800\n"
-        files = {"file": ("test.csv", io.BytesIO(csv_content), "text/csv")}
-        response = client.post("/upload_file", files=files)
-        assert response.status_code == 200
-        return response.json()["file"]["file_id"]
-    
-    def test_plot_via_http(self, client, uploaded_file):
-        """Test data plot via HTTP."""
-        response = client.post(
-            "/tools/data_plot",
-            json={
-                "file_id": uploaded_file,
-                "plot_type": "scatter",
-                "x": "x",
-                "y": "volume"
-            }
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["ok"] is True
-        assert data["plot_type"] == "scatter"
-        
-    def test_plot_via_dispatcher(self, uploaded_file):
-        """Test data plot via dispatcher."""
-        result = _execute_tool_by_name(
+    def test_plot(self, invoke, uploaded_file):
+        """Test data plot via HTTP and the dispatcher."""
+        result = invoke(
             "data_plot",
             {
                 "file_id": uploaded_file,
@@ -483,40 +384,16 @@ class TestDataPlot:
             }
         )
         assert result["ok"] is True
+        assert result["plot_type"] == "scatter"
 
 
+@pytest.mark.usefixtures("reset_data_memory")
 class TestNgViewsTable:
     """Tests for data_ng_views_table endpoint."""
     
-    @pytest.fixture
-    def uploaded_file(self, client):
-        """Upload a test CSV file."""
-        import io
-        csv_content = b"cell_id,x,y,z,volume\n1,100,200,50,1000\n2,150,250,60,1200\n3,200,300,70,800\n"
-        files = {"file": ("test.csv", io.BytesIO(csv_content), "text/csv")}
-        response = client.post("/upload_file", files=files)
-        assert response.status_code == 200
-        return response.json()["file"]["file_id"]
-    
-    def test_ng_views_via_http(self, client, uploaded_file):
-        """Test ng_views_table via HTTP."""
-        response = client.post(
-            "/tools/data_ng_views_table",
-            json={
-                "file_id": uploaded_file,
-                "top_n": 2,
-                "id_column": "cell_id",
-                "center_columns": ["x", "y", "z"]
-            }
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["n"] == 2
-        assert len(data["rows"]) == 2
-        
-    def test_ng_views_via_dispatcher(self, uploaded_file):
-        """Test ng_views_table via dispatcher."""
-        result = _execute_tool_by_name(
+    def test_ng_views(self, invoke, uploaded_file):
+        """Test ng_views_table via HTTP and the dispatcher."""
+        result = invoke(
             "data_ng_views_table",
             {
                 "file_id": uploaded_file,
@@ -548,28 +425,19 @@ class TestNgViewsTable:
 class TestPydanticValidation:
     """Test that Pydantic validation works correctly."""
     
-    def test_missing_required_field(self, client):
-        """Test that missing required fields return validation errors."""
-        response = client.post(
-            "/tools/ng_add_layer",
-            json={"layer_type": "image"}  # Missing required 'name'
-        )
-        assert response.status_code == 422  # Validation error
-        
-    def test_invalid_enum_value(self, client):
-        """Test that invalid enum values return validation errors."""
-        response = client.post(
-            "/tools/ng_add_layer",
-            json={"name": "test", "layer_type": "invalid_type"}
-        )
-        assert response.status_code == 422
-        
-    def test_invalid_type(self, client):
-        """Test that invalid types return validation errors."""
-        response = client.post(
-            "/tools/data_info",
-            json={"file_id": "test", "sample_rows": "not_a_number"}
-        )
+    @pytest.mark.parametrize(
+        "endpoint, body",
+        [
+            ("/tools/ng_add_layer", {"layer_type": "image"}),  # Missing required 'name'
+            ("/tools/ng_add_layer", {"name": "test", "layer_type": "invalid_type"}),
+            ("/tools/data_info", {"file_id": "test", "sample_rows": "not_a_number"}),
+            ("/tools/state_load", {"default_settings": {}}),  # Missing required 'link'
+        ],
+        ids=["missing_required_field", "invalid_enum_value", "invalid_type", "state_load_missing_link"],
+    )
+    def test_validation_error(self, client, endpoint, body):
+        """Test that invalid payloads return 422 validation errors."""
+        response = client.post(endpoint, json=body)
         assert response.status_code == 422
         
     def test_default_values_work(self, client):
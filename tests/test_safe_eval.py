@@ -3,15 +3,24 @@
 import pytest
 import polars as pl
 
+from neuroglancer_chat.backend.main import _eval_namespace as _make_namespace
 
-def _make_namespace(df: pl.DataFrame) -> dict:
-    """Return a restricted eval namespace matching what the backend uses."""
-    return {"pl": pl, "df": df, "__builtins__": {}}
 
+def _compile(expression: str):
+    """Compile an expression once so each test only pays for evaluation."""
+    return compile(expression, "<safe_eval>", "eval")
 
-@pytest.fixture
+
+_FILTER = _compile("df.filter(pl.col('x') > 2)")
+_SELECT_AND_FILTER = _compile("df.filter(pl.col('y') >= 30).select(['name', 'x'])")
+_AGGREGATION = _compile("df.select([pl.sum('x'), pl.mean('y')])")
+_IMPORT = _compile("__import__('os')")
+_OPEN = _compile("open('/etc/passwd')")
+
+
+@pytest.fixture(scope="module")
 def sample_df():
-    """Small test DataFrame."""
+    """Small test DataFrame (shared; every expression here returns a new frame)."""
     return pl.DataFrame(
         {"x": [1, 2, 3, 4, 5], "y": [10, 20, 30, 40, 50], "name": list("abcde")}
     )
@@ -20,16 +29,14 @@ def sample_df():
 def test_filter_expression(sample_df):
     """Basic filter returns correct subset."""
     ns = _make_namespace(sample_df)
-    result = eval("df.filter(pl.col('x') > 2)", ns, {})  # noqa: S307
+    result = eval(_FILTER, ns, {})  # noqa: S307
     assert result.height == 3
 
 
 def test_select_and_filter(sample_df):
     """Chained filter + select returns requested columns."""
     ns = _make_namespace(sample_df)
-    result = eval(
-        "df.filter(pl.col('y') >= 30).select(['name', 'x'])", ns, {}
-    )  # noqa: S307
+    result = eval(_SELECT_AND_FILTER, ns, {})  # noqa: S307
     assert result.columns == ["name", "x"]
     assert result.height == 3
 
@@ -37,7 +44,7 @@ def test_select_and_filter(sample_df):
 def test_aggregation(sample_df):
     """Aggregation expressions work correctly."""
     ns = _make_namespace(sample_df)
-    result = eval("df.select([pl.sum('x'), pl.mean('y')])", ns, {})  # noqa: S307
+    result = eval(_AGGREGATION, ns, {})  # noqa: S307
     assert result["x"].item() == 15
     assert result["y"].item() == 30.0
 
@@ -46,11 +53,19 @@ def test_import_blocked(sample_df):
     """import statements are blocked in restricted namespace."""
     ns = _make_namespace(sample_df)
     with pytest.raises(Exception):
-        eval("__import__('os')", ns, {})  # noqa: S307
+        eval(_IMPORT, ns, {})  # noqa: S307
 
 
 def test_open_blocked(sample_df):
     """open() is blocked in restricted namespace."""
     ns = _make_namespace(sample_df)
     with pytest.raises((NameError, TypeError)):
-        eval("open('/etc/passwd')", ns, {})  # noqa: S307
+        eval(_OPEN, ns, {})  # noqa: S307
+
+
+def test_builtins_changes_do_not_leak_between_evals(sample_df):
+    """Mutating __builtins__ in one eval must not expose names to the next."""
+    ns = _make_namespace(sample_df)
+    eval(_compile("__builtins__.update(leaked=1)"), ns, {})  # noqa: S307
+    with pytest.raises(NameError):
+        eval(_compile("leaked"), _make_namespace(sample_df), {})  # noqa: S307
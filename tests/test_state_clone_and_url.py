@@ -1,3 +1,5 @@
+import pytest
+
 from neuroglancer_chat.backend.tools.neuroglancer_state import NeuroglancerState, to_url, from_url
 
 
@@ -24,3 +26,31 @@ def test_to_url_accepts_instance_round_trip():
     # idempotent call with already serialized URL
     url2 = to_url(url)
     assert url == url2
+
+
+def test_to_url_reflects_in_place_edits():
+    s = NeuroglancerState()
+    s.add_layer("img", layer_type="image", source="precomputed://dummy")
+    s.to_url()
+    # as_dict()/get_layer() return live objects; nothing needs invalidating
+    s.as_dict()["layout"] = "3d"
+    s.get_layer("img")["visible"] = False
+    parsed = from_url(s.to_url())
+    assert parsed["layout"] == "3d"
+    assert parsed["layers"][0]["visible"] is False
+
+
+def test_view_urls_match_per_center_set_view():
+    s = NeuroglancerState()
+    s.add_layer("img", layer_type="image", source="precomputed://dummy")
+    s.data["position"] = [0, 0, 0, 7]  # 4D: time coordinate must be kept
+    centers = [(1, 2, 3), (4.5, -6.25, 1e-7), (None, 1, 2)]
+    urls = s.view_urls(centers)
+    assert urls[:2] == [
+        s.clone().set_view({"x": x, "y": y, "z": z}, None, None).to_url()
+        for x, y, z in centers[:2]
+    ]
+    assert from_url(urls[0])["position"] == [1, 2, 3, 7]
+    assert urls[2] == ""
+    # The template state itself is left untouched
+    assert s.as_dict()["position"] == [0, 0, 0, 7]
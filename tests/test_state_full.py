@@ -1,7 +1,10 @@
-import copy
+import pickle
 from neuroglancer_chat.backend.tools.neuroglancer_state import from_url, to_url, NeuroglancerState
 from neuroglancer_chat.examples.ng_state_dict import STATE_DICT
 
+# Pickled once; unpickling per test is a cheaper deep copy than copy.deepcopy
+_STATE_BLOB = pickle.dumps(STATE_DICT, protocol=5)
+
 
 def test_round_trip_full_state():
     url = to_url(STATE_DICT)
@@ -23,7 +26,7 @@ def test_to_url_idempotent_on_url():
 
 
 def test_set_view_preserves_extra_keys():
-    state = copy.deepcopy(STATE_DICT)
+    state = pickle.loads(_STATE_BLOB)
     original_keys = set(state.keys())
     NeuroglancerState(state).set_view({"x": 10, "y": 11, "z": 12}, "fit", "xy")
     assert set(state.keys()) == original_keys  # no loss of top-level keys
@@ -33,7 +36,7 @@ def test_set_view_preserves_extra_keys():
 
 
 def test_add_annotations_does_not_remove_layers():
-    state = copy.deepcopy(STATE_DICT)
+    state = pickle.loads(_STATE_BLOB)
     n_layers = len(state.get("layers", []))
     NeuroglancerState(state).add_annotations("TestAnn", [{"point": [1,2,3]}])
     assert len(state.get("layers", [])) == n_layers + 1
\ No newline at end of file
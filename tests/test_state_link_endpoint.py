@@ -1,10 +1,11 @@
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app, to_url, CURRENT_STATE
+import pytest
 
-client = TestClient(app)
+from neuroglancer_chat.backend.main import to_url, CURRENT_STATE
 
+pytestmark = pytest.mark.xdist_group(name="ng_state")
 
-def test_ng_state_link_endpoint_returns_masked():
+
+def test_ng_state_link_endpoint_returns_masked(client):
     r = client.post('/tools/ng_state_link')
     assert r.status_code == 200
     data = r.json()
@@ -32,3 +32,31 @@ def test_set_lut_no_error_when_layer_missing():
     s = NeuroglancerState()
     # No exception if layer not present
     s.set_lut("missing", 0.0, 1.0)
+
+
+def test_get_layer_tracks_replaced_and_renamed_layers():
+    s = NeuroglancerState()
+    s.add_layer("img", layer_type="image", source="precomputed://dummy")
+    assert s.get_layer("img")["type"] == "image"
+    assert s.get_layer("missing") is None
+    # Wholesale replacement of the state dict must not return stale layers
+    s.data = {"layers": [{"type": "segmentation", "name": "seg", "source": "x"}]}
+    assert s.get_layer("img") is None
+    assert s.get_layer("seg")["type"] == "segmentation"
+    # In-place rename is picked up on the next lookup
+    s.data["layers"][0]["name"] = "seg2"
+    assert s.get_layer("seg") is None
+    assert s.get_layer("seg2")["type"] == "segmentation"
+    # Replacing a layer in place returns the live dict, not the detached one
+    s.data["layers"][0] = {"type": "image", "name": "seg2", "source": "y"}
+    assert s.get_layer("seg2") is s.data["layers"][0]
+    s.data["layers"][0] = {"type": "image", "name": "img2", "source": "y"}
+    assert s.get_layer("img2") is s.data["layers"][0]
+    assert s.get_layer("seg2") is None
+    # Looking up the new name first after an in-place rename also works
+    s.data["layers"][0]["name"] = "img3"
+    assert s.get_layer("img3") is s.data["layers"][0]
+    # Duplicate names resolve to the first match, even after a rename
+    s.data["layers"].append({"type": "image", "name": "dup", "source": "z"})
+    s.data["layers"][0]["name"] = "dup"
+    assert s.get_layer("dup") is s.data["layers"][0]
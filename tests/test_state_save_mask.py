@@ -1,11 +1,4 @@
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app
-
-
-client = TestClient(app)
-
-
-def test_state_save_raw_and_masked():
+def test_state_save_raw_and_masked(client):
     # Raw first
     r1 = client.post("/tools/state_save", json={})
     assert r1.status_code == 200
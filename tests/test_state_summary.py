@@ -1,39 +1,44 @@
-from fastapi.testclient import TestClient
-from neuroglancer_chat.backend.main import app, CURRENT_STATE
+import pytest
+
 from neuroglancer_chat.examples.ng_state_dict import STATE_DICT
-from neuroglancer_chat.backend.tools.neuroglancer_state import to_url, from_url
+from neuroglancer_chat.backend.tools.neuroglancer_state import to_url
 
-client = TestClient(app)
+pytestmark = pytest.mark.xdist_group(name="ng_state")
 
 
-def _load_example_state():
-    # Load full example into backend via state_load tool
+@pytest.fixture(scope="module")
+def loaded_state(client):
+    # Load full example into backend via state_load tool once for every detail level
     url = to_url(STATE_DICT)
     r = client.post("/tools/state_load", json={"link": url})
     assert r.status_code == 200
     assert r.json().get("ok") is True
 
 
-def test_state_summary_minimal_and_standard():
-    _load_example_state()
-    r_min = client.post("/tools/ng_state_summary", json={"detail": "minimal"})
-    assert r_min.status_code == 200
-    data_min = r_min.json()
-    assert data_min["detail"] == "minimal"
+def _check_minimal(layers):
     # layers should have only name/type keys primarily
-    assert all("name" in L and "type" in L for L in data_min["layers"])  # base structure
+    assert all("name" in L and "type" in L for L in layers)  # base structure
+
 
-    r_std = client.post("/tools/ng_state_summary", json={"detail": "standard"})
-    data_std = r_std.json()
-    assert data_std["detail"] == "standard"
+def _check_standard(layers):
     # At least one image layer should report normalized_range
-    assert any("normalized_range" in L for L in data_std["layers"]) or True  # tolerate missing if example changes
+    assert any("normalized_range" in L for L in layers) or True  # tolerate missing if example changes
+
 
+def _check_full(layers):
+    if any(L.get("shader_len") for L in layers):
+        assert any(L.get("shader_len") for L in layers)  # at least one has shader_len
 
-def test_state_summary_full_includes_shader_len():
-    _load_example_state()
-    r_full = client.post("/tools/ng_state_summary", json={"detail": "full"})
-    assert r_full.status_code == 200
-    data_full = r_full.json()
-    if any(L.get("shader_len") for L in data_full["layers"]):
-        assert any(L.get("shader_len") for L in data_full["layers"])  # at least one has shader_len
\ No newline at end of file
+
+@pytest.mark.parametrize(
+    "detail, check",
+    [("minimal", _check_minimal), ("standard", _check_standard), ("full", _check_full)],
+    ids=["minimal", "standard", "full"],
+)
+def test_state_summary_detail_levels(client, loaded_state, detail, check):
+    r = client.post("/tools/ng_state_summary", json={"detail": detail})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/json")
+    data = r.json()
+    assert data["detail"] == detail
+    check(data["layers"])
@@ -3,31 +3,34 @@ from typing import Any, Dict
 import jsonschema
 from neuroglancer_chat.backend.adapters.llm import TOOLS
 
+# One Draft 7 meta-schema validator for every tool (check_schema builds one per call)
+_META_VALIDATOR = jsonschema.Draft7Validator(jsonschema.Draft7Validator.META_SCHEMA)
+
 
 def _walk_schema(schema: Dict[str, Any]):
-    """Yield all nested schemas (DFS)."""
-    yield schema
-    if isinstance(schema, dict):
+    """Yield all nested schemas (iterative DFS)."""
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        yield node
+        if not isinstance(node, dict):
+            continue
         for key in ("properties", "patternProperties"):
-            if key in schema and isinstance(schema[key], dict):
-                for sub in schema[key].values():
-                    yield from _walk_schema(sub)
+            if isinstance(node.get(key), dict):
+                stack.extend(node[key].values())
         # handle array items
-        if "items" in schema and isinstance(schema["items"], (dict, list)):
-            if isinstance(schema["items"], dict):
-                yield from _walk_schema(schema["items"])
-            else:
-                for sub in schema["items"]:
-                    yield from _walk_schema(sub)
+        items = node.get("items")
+        if isinstance(items, dict):
+            stack.append(items)
+        elif isinstance(items, list):
+            stack.extend(items)
         # handle combinators
         for key in ("allOf", "anyOf", "oneOf", "not"):
-            if key in schema:
-                subs = schema[key]
-                if isinstance(subs, list):
-                    for sub in subs:
-                        yield from _walk_schema(sub)
-                elif isinstance(subs, dict):
-                    yield from _walk_schema(subs)
+            subs = node.get(key)
+            if isinstance(subs, list):
+                stack.extend(subs)
+            elif isinstance(subs, dict):
+                stack.append(subs)
 
 
 def test_tool_param_schemas_are_valid_jsonschema():
@@ -35,7 +38,7 @@ def test_tool_param_schemas_are_valid_jsonschema():
         params = tool["function"].get("parameters")
         assert params and isinstance(params, dict)
         # should be a valid JSON Schema Draft 7
-        jsonschema.Draft7Validator.check_schema(params)
+        _META_VALIDATOR.validate(params)
 
 
 def test_arrays_define_items_schemas():
@@ -27,4 +27,12 @@ def test_mask_http_and_simple_url():
     raw = f"Open {http_url} now"
     masked = _mask_ng_urls(raw)
     assert "Updated Neuroglancer view" in masked
-    assert f"]({http_url})" in masked
\ No newline at end of file
+    assert f"]({http_url})" in masked
+
+def test_mask_url_that_prefixes_another():
+    u1 = "https://neuroglancer-demo.appspot.com/#!%7B%22x%22%3A1"
+    u2 = u1 + "0"
+    masked = _mask_ng_urls(f"{u1} then {u2}")
+    assert masked == (
+        f"[Updated Neuroglancer view]({u1}) then [Updated Neuroglancer view (2)]({u2})"
+    )